@@ -1,8 +1,6 @@
-import ollama
-
 import sys 
 sys.path.insert(0, "llm-prompts")
-from  llm_clnt_factory_api import ClientFactory, get_commpletion
+from  llm_clnt_factory_api import ClientFactory, get_completions
 
 # Chat with the default model
 contents = [
@@ -12,22 +10,23 @@ contents = [
             ]
 
 ROLE = 'user'
-clnt = ollama.Client()
 
 # create an ollam client instance using our
 # client factory method 
 client_factory = ClientFactory()
-client_type = "ollam"
-client_factory.register_client(client_type, ollama.Client)
+client_type = "ollama"
+client_factory.register_client(client_type)
 client_kwargs = {}
 clnt = client_factory.create_client(client_type, **client_kwargs)
 
-for content in contents:
-    # get the response
-    BOLD_BEGIN = "\033[1m"
-    BOLD_END   =   "\033[0m"
-    response = get_commpletion(clnt, 
-                               "mistral", "user", content)
-    print(f"\n{BOLD_BEGIN}Prompt:{BOLD_END} {content}")
+# send all the prompts at once; results come back in
+# the same order as contents
+BOLD_BEGIN = "\033[1m"
+BOLD_END   =   "\033[0m"
+results = get_completions(clnt, "mistral", "user", contents,
+                          max_concurrency=len(contents))
+for result in results:
+    response = result.response if result.ok else f"Error: {result.error}"
+    print(f"\n{BOLD_BEGIN}Prompt:{BOLD_END} {result.user_content}")
     print(f"\n{BOLD_BEGIN}Answer:{BOLD_END} {response}")
     print("-------------------")
@@ -0,0 +1,167 @@
+import sys
+sys.path.insert(0, "llm-prompts")
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+from llm_clnt_factory_api import ClientFactory
+
+#
+# Run a batch of prompts against a local Ollama server as fast as it can
+# serve them. Two things dominate a small batch on a CPU box: loading the
+# model on the first call, and sending prompts one after another. So the
+# runner first loads the model with an empty request and pins it in memory
+# with keep_alive, then sends the prompts concurrently, as many at a time
+# as the server has parallel slots (OLLAMA_NUM_PARALLEL). More than that
+# only queues on the server and makes every prompt look slower.
+#
+# python chatbots/ollama_runner.py --model mistral --parallel 4 --keep-alive 30m
+#
+# keep_alive is sent with every request too, since each request resets
+# how long the server keeps the model loaded; -1 keeps it until the
+# server stops or you unload it with keep_alive 0.
+#
+
+@dataclass
+class PromptResult:
+    prompt: str
+    response: Optional[str] = None
+    latency: float = 0.0
+    eval_tokens: int = 0
+    eval_seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        # generation speed as the server measured it, without queueing
+        # or prompt processing
+        if not self.eval_seconds:
+            return None
+        return self.eval_tokens / self.eval_seconds
+
+class OllamaRunner:
+    """
+    Warm up a model on an Ollama server and send prompts to it
+    concurrently, matched to the server's parallel slots.
+    """
+    def __init__(self, clnt: object, model: str, parallel: int = 4,
+                 keep_alive: Union[str, int] = "30m", system_content: Optional[str] = None,
+                 temperature: float = 0.8, max_tokens: Optional[int] = None):
+        self.clnt = clnt
+        self.model = model
+        self.parallel = parallel
+        self.keep_alive = keep_alive
+        self.system_content = system_content
+        self.options = {"temperature": temperature}
+        if max_tokens is not None:
+            self.options["num_predict"] = max_tokens
+
+    async def warm_up(self) -> float:
+        """
+        Load the model into memory and pin it; returns the load time in seconds.
+        """
+        start = time.perf_counter()
+        # an empty prompt loads the model without generating anything
+        await self.clnt.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+        return time.perf_counter() - start
+
+    async def run_one(self, prompt: str) -> PromptResult:
+        messages = [{"role": "user", "content": prompt}]
+        if self.system_content:
+            messages.insert(0, {"role": "system", "content": self.system_content})
+        result = PromptResult(prompt)
+        start = time.perf_counter()
+        try:
+            response = await self.clnt.chat(model=self.model, messages=messages,
+                                            options=self.options, keep_alive=self.keep_alive)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        else:
+            result.response = response["message"]["content"]
+            result.eval_tokens = response.get("eval_count") or 0
+            result.eval_seconds = (response.get("eval_duration") or 0) / 1e9
+        result.latency = time.perf_counter() - start
+        return result
+
+    async def run(self, prompts: List[str]) -> List[PromptResult]:
+        """
+        Send all prompts, at most parallel at a time; results come back
+        in the same order as prompts.
+        """
+        semaphore = asyncio.Semaphore(self.parallel)
+
+        async def bounded(prompt):
+            async with semaphore:
+                return await self.run_one(prompt)
+
+        return await asyncio.gather(*(bounded(p) for p in prompts))
+
+def print_report(results: List[PromptResult], wall: float, load_seconds: float) -> None:
+    BOLD_BEGIN = "\033[1m"
+    BOLD_END   =   "\033[0m"
+    for result in results:
+        print(f"\n{BOLD_BEGIN}Prompt:{BOLD_END} {result.prompt}")
+        if result.error:
+            print(f"{BOLD_BEGIN}Error:{BOLD_END} {result.error}")
+            continue
+        rate = f"{result.tokens_per_sec:.1f} tokens/sec" if result.tokens_per_sec else "n/a"
+        print(f"{BOLD_BEGIN}Answer:{BOLD_END} {result.response}")
+        print(f"latency={result.latency:.2f}s tokens={result.eval_tokens} ({rate})")
+
+    ok = [r for r in results if r.error is None]
+    tokens = sum(r.eval_tokens for r in ok)
+    print('-' * 50)
+    print(f"model load: {load_seconds:.2f}s")
+    print(f"prompts: {len(ok)} ok, {len(results) - len(ok)} failed in {wall:.2f}s")
+    if ok:
+        print(f"latency: mean {sum(r.latency for r in ok) / len(ok):.2f}s, max {max(r.latency for r in ok):.2f}s")
+    print(f"aggregate: {tokens} tokens, {tokens / wall:.1f} tokens/sec" if wall > 0 else "")
+
+async def main(args, prompts: List[str]) -> None:
+    client_factory = ClientFactory(max_connections=args.parallel)
+    client_factory.register_client("async_ollama")
+    clnt = client_factory.get_client("async_ollama", **({"host": args.host} if args.host else {}))
+    runner = OllamaRunner(clnt, args.model, parallel=args.parallel, keep_alive=args.keep_alive,
+                          temperature=args.temperature, max_tokens=args.max_tokens)
+    try:
+        print(f"Loading {args.model}...")
+        load_seconds = await runner.warm_up()
+        print(f"Sending {len(prompts)} prompts, {args.parallel} at a time...")
+        start = time.perf_counter()
+        results = await runner.run(prompts)
+        print_report(results, time.perf_counter() - start, load_seconds)
+    finally:
+        await client_factory.aclose()
+
+def _keep_alive(value: str) -> Union[str, int]:
+    # Ollama takes a duration like "30m", or seconds, with -1 for forever
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+if __name__ == "__main__":
+    contents = [
+                "Why did the chicken cross the road?",
+                "Write a haiku about the ocean",
+                "How can I make a good impression on a first date?",
+                ]
+    parser = argparse.ArgumentParser(description="Warm up an Ollama model and run prompts against it concurrently")
+    parser.add_argument("--model", default="mistral")
+    parser.add_argument("--host", default=None, help="Ollama server, e.g. http://localhost:11434")
+    parser.add_argument("--parallel", type=int, default=int(os.getenv("OLLAMA_NUM_PARALLEL", 4)),
+                        help="prompts in flight; match the server's OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--keep-alive", type=_keep_alive, default="30m",
+                        help="how long the model stays loaded, e.g. 30m, or -1 to pin it")
+    parser.add_argument("--prompts-file", default=None, help="file with one prompt per line")
+    parser.add_argument("--temperature", type=float, default=0.8)
+    parser.add_argument("--max-tokens", type=int, default=None, help="by default, the model's own limit")
+    args = parser.parse_args()
+
+    if args.prompts_file:
+        with open(args.prompts_file) as f:
+            contents = [line.strip() for line in f if line.strip()]
+    asyncio.run(main(args, contents))
@@ -4,12 +4,16 @@
 # The example uses the Llama3 model, served by OLlama, to perform the tasks.
 
 import argparse
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm-prompts"))
 
 import dspy
 import warnings
 from dspy.datasets import HotPotQA
 from dspy.evaluate.evaluate import Evaluate
 from dspy_utils import gold_passages_retrieved, BOLD_BEGIN, BOLD_END, SimplifiedPipeline, downlad_dataset, parse_args
+from llm_ledger import TokenLedger
 
 # Questions to ask the RAG program using the HotPotQA dataset
 # later we we'll use the questions to test the unoptimized pipeline
@@ -36,6 +40,10 @@ if __name__ == "__main__":
     colbertv2_wiki17_abstracts = dspy.ColBERTv2(url='http://20.102.90.50:2017/wiki17_abstracts')
     dspy.settings.configure(lm=ollama_llama3, rm=colbertv2_wiki17_abstracts)
 
+    # Record the tokens every pipeline call uses; see the totals with
+    # python llm-prompts/llm_ledger.py
+    ledger = TokenLedger(run_name="15_dspy_unoptimized_pipeline")
+
     # Print using the model Llama3
     print(f"{BOLD_BEGIN}Using the {ollama_llama3.model_name} model{BOLD_END}")
     print(f"{BOLD_BEGIN}Using the ColBERTv2 at (url='http://20.102.90.50:2017/wiki17_abstracts) for retrieval{BOLD_END}")
@@ -49,7 +57,8 @@ if __name__ == "__main__":
     for question in QUESTIONS:
         # Get the prediction. This contains `pred.context` and `pred.answer`.
         uncompiled_pipeline = SimplifiedPipeline()  # uncompiled (i.e., zero-shot) program
-        pred = uncompiled_pipeline(question)
+        with ledger.dspy_calls(ollama_llama3, "SimplifiedPipeline"):
+            pred = uncompiled_pipeline(question)
 
         # Print the contexts and the answer.
         print(f"Question: {question}")
@@ -73,7 +82,10 @@ if __name__ == "__main__":
     # Set up the `evaluate_on_hotpotqa` function. 
     evaluate_on_hotpotqa = Evaluate(devset=devset, num_threads=1, display_progress=True, display_table=5)
     # Evaluate the uncompiled pipeline on the HotPotQA dataset
-    uncompiled_retrieval_score = evaluate_on_hotpotqa(uncompiled_pipeline, metric=gold_passages_retrieved) 
+    with ledger.dspy_calls(ollama_llama3, "SimplifiedPipeline/evaluate"):
+        uncompiled_retrieval_score = evaluate_on_hotpotqa(uncompiled_pipeline, metric=gold_passages_retrieved) 
 
     print(f"## Retrieval Score for uncompiled pipeline: {uncompiled_retrieval_score}")
-    print("--------------------------")
\ No newline at end of file
+    print("--------------------------")
+    ledger.print_rollup()
+    ledger.close()
\ No newline at end of file
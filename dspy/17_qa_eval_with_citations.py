@@ -1,4 +1,7 @@
 import argparse
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm-prompts"))
 import warnings
 import random
 from tqdm import tqdm
@@ -8,6 +11,7 @@ import dspy
 from dspy_utils import BOLD_BEGIN, BOLD_END, downlad_dataset, LongFormQA, extract_cited_titles_from_paragraph, extract_cited_titles_from_contexts
 from dspy_utils import answer_correctness, citation_faithfulness, calculate_recall, calculate_precision
 from dspy.teleprompt import BootstrapFewShotWithRandomSearch
+from llm_ledger import TokenLedger
 
 def get_cmdline_args(debug=False, trainset_size=300, devset_size=300):
     # Create the parser
@@ -23,7 +27,7 @@ def get_cmdline_args(debug=False, trainset_size=300, devset_size=300):
     args = parser.parse_args()
     return args
 
-def evaluate(module,  devset_size=300, debug=False):
+def evaluate(module, ledger, devset_size=300, debug=False):
     correctness_values = []
     recall_values = []
     precision_values = []
@@ -31,9 +35,11 @@ def evaluate(module,  devset_size=300, debug=False):
     for i, _ in enumerate(tqdm(range(devset_size), desc="Evaluating the model on the devset for correctness and faithfulness")):
         example = devset[i]
         try:
-            pred = module(question=example.question)
+            with ledger.dspy_calls(dspy.settings.lm, "LongFormQA/evaluate"):
+                pred = module(question=example.question)
             correctness_values.append(answer_correctness(example, pred))
-            citation_faithfulness_score, _ = citation_faithfulness(None, pred, None)
+            with ledger.dspy_calls(dspy.settings.lm, "citation_faithfulness/evaluate"):
+                citation_faithfulness_score, _ = citation_faithfulness(None, pred, None)
             citation_faithfulness_values.append(citation_faithfulness_score)
             recall = calculate_recall(example, pred)
             precision = calculate_precision(example, pred)
@@ -83,6 +89,10 @@ if __name__ == "__main__":
     colbertv2_wiki17_abstracts = dspy.ColBERTv2(url='http://20.102.90.50:2017/wiki17_abstracts')
     dspy.settings.configure(lm=ollama_llama3, rm=colbertv2_wiki17_abstracts)
 
+    # Record the tokens used by answering and by the faithfulness checks
+    # separately; see the totals with python llm-prompts/llm_ledger.py
+    ledger = TokenLedger(run_name="17_qa_eval_with_citations")
+
     # Print using the model Llama3
     print(f"{BOLD_BEGIN}Using the {ollama_llama3.model_name} model{BOLD_END}")
     print(f"{BOLD_BEGIN}Using the ColBERTv2 at (url='http://20.102.90.50:2017/wiki17_abstracts) for retrieval{BOLD_END}")
@@ -103,7 +113,8 @@ if __name__ == "__main__":
         gold_titles = devset[rand_idx].gold_titles
         print(f"{BOLD_BEGIN}Question-{idx+1}{BOLD_END}: {question}")
         print(f"{BOLD_BEGIN}Relevant Wikipedia Titles for Question-{idx+1}: {BOLD_END}{gold_titles}")
-        pred = long_form_qa(question)
+        with ledger.dspy_calls(ollama_llama3, "LongFormQA"):
+            pred = long_form_qa(question)
         print(f"{BOLD_BEGIN}Answer-{idx+1} context{BOLD_END}: {pred.context}")
         context_titles = extract_cited_titles_from_contexts(pred.context)
         print(f"{BOLD_BEGIN}Answer-{idx+1} titles in context {BOLD_END}: {context_titles}")
@@ -114,7 +125,8 @@ if __name__ == "__main__":
         print(f"{BOLD_BEGIN}Returned full response Answer-{idx+1}{BOLD_END}: {pred}")
         print("--------------------------")
         print("\n")
-        citation_faithfulness_score, _ = citation_faithfulness(None, pred, None)
+        with ledger.dspy_calls(ollama_llama3, "citation_faithfulness"):
+            citation_faithfulness_score, _ = citation_faithfulness(None, pred, None)
         print(f"{BOLD_BEGIN}Predicted Paragraph:{BOLD_END} {pred.paragraph}")
         print(f"{BOLD_BEGIN}Citation Faithfulness: {BOLD_END} {citation_faithfulness_score}")
         print("-----------------------")
@@ -122,5 +134,7 @@ if __name__ == "__main__":
     # Let try to evaluate for correctness and faithfulness
     devset_size = 100
     print(f"{BOLD_BEGIN}Evaluating the model on the dev set for {devset_size} samples{BOLD_END}...")
-    evaluate(long_form_qa, devset_size=100, debug=True)
+    evaluate(long_form_qa, ledger, devset_size=100, debug=True)
     print("--------------------------")
+    ledger.print_rollup()
+    ledger.close()
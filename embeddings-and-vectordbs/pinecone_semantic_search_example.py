@@ -7,14 +7,25 @@ Only a single index is allowed in the community edition.
 The code below demonstrates how to create an index, upsert embeddings.
 It also demonstrates how to run a semantic search on the index.
 
+The reviews go in their own index, imdb-reviews-index, so they never
+mix with the PDF chunks the RAG scripts keep in starter-index; on a plan
+limited to a single index, run with --delete-index. The index is kept
+between runs: reviews get ids derived from their text, and a local
+manifest of those ids means a re-run only embeds reviews the index does
+not have yet. Use --rebuild to start afresh and --delete-index to remove
+the index at the end.
+
 """
+import argparse
 import os
 import sys
+sys.path.insert(0, "rags")
 from pinecone import Pinecone, PodSpec
 from datasets import load_dataset
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv, find_dotenv
 from tqdm.auto import tqdm
+from rag_utils import IngestManifest, embed_and_upsert
 
 def extract_and_print_matches(results):
     '''
@@ -26,7 +37,11 @@ def extract_and_print_matches(results):
 
 # Main function
 if __name__ == "__main__":
-    
+    parser = argparse.ArgumentParser(description="Semantic search over IMDB reviews with Pinecone")
+    parser.add_argument("--rebuild", action="store_true", help="delete the index and embed every review again")
+    parser.add_argument("--delete-index", action="store_true", help="delete the index when done")
+    args = parser.parse_args()
+
     # Load the dataset, only the first 50k samples
     dataset = load_dataset("imdb", split='train[:50000]')
     print(dataset[:1])
@@ -60,43 +75,45 @@ if __name__ == "__main__":
     ) 
 
     # check if index exists in pinecone
-    index_name = "starter-index"
+    index_name = "imdb-reviews-index"
     existing_indexes = [
         index_info["name"] for index_info in pc.list_indexes()
     ]
 
-    if index_name in existing_indexes:
+    manifest_path = os.path.join(os.path.expanduser("~"), ".cache", "genai-cookbook",
+                                 f"{index_name}-manifest.json")
+    if index_name in existing_indexes and args.rebuild:
         print(f"Index {index_name} already exists. Deleting it.")
         pc.delete_index(index_name)
+        existing_indexes.remove(index_name)
 
     print('-' * 50)
-    # Create a new index
-    print(f"Creating a new index {index_name}...")
-    pc.create_index(name=index_name,
-            metric="cosine",
-            dimension=embeddings.shape[1],
-            spec=PodSpec(environment="gcp-starter")
-    )
+    if index_name not in existing_indexes:
+        # Create a new index; a fresh index holds none of the manifest's reviews
+        print(f"Creating a new index {index_name}...")
+        pc.create_index(name=index_name,
+                metric="cosine",
+                dimension=embeddings.shape[1],
+                spec=PodSpec(environment="gcp-starter")
+        )
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
     print(f"embedding shape: {embeddings.shape}")
     
     # Connect or get a handle to the index
     pindex = pc.Index(index_name)
 
-    # Insert the embeddings into the index
+    # Insert the embeddings of the reviews the index does not have yet,
+    # and delete those of reviews no longer in the dataset
     print("Upserting the embeddings into the index...")
     batch_size = 500
-    for i in tqdm(range(0, len(reviews), batch_size)):
-        i_end = min(i+batch_size, len(reviews))
-        # create IDs each batch
-        ids = [str(x) for x in range(i, i_end)]
-        # create metadata batch
-        metadatas = [{'text': text} for text in reviews[i:i_end]]
-        batch = reviews[i:i+500]
-        embeddings = model.encode(batch)
-        records = zip(ids, embeddings, metadatas)
-        print(f"Upserting {i} to {i_end} records...")
-        # upsert to Pinecone
-        pindex.upsert(vectors=records)
+    manifest = IngestManifest(manifest_path)
+    manifest.check_index(pindex, f"{index_name}@{pc.describe_index(index_name).host}")
+    records = manifest.records(("imdb", text, {}) for text in tqdm(reviews))
+    stats = embed_and_upsert(model, pindex, records, encode_batch_size=batch_size,
+                             upsert_batch_size=batch_size)
+    deleted = manifest.commit(pindex, ["imdb"])
+    print(f"Upserted {stats.chunks} new reviews, deleted {deleted} old ones")
 
     print('-' * 50)
     # Check the index stats
@@ -122,6 +139,8 @@ if __name__ == "__main__":
     extract_and_print_matches(results)
 
     # Delete the index
-    print(f"Deleting the index {index_name}...")
-    pc.delete_index(index_name)
+    if args.delete_index:
+        print(f"Deleting the index {index_name}...")
+        pc.delete_index(index_name)
+        os.remove(manifest_path)
     print("Done!")
\ No newline at end of file
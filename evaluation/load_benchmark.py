@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+sys.path.insert(0, "llm-prompts")
+from dotenv import load_dotenv, find_dotenv
+
+from llm_clnt_factory_api import ClientFactory, astream_completion
+from llm_rate_limiter import estimate_tokens
+
+#
+# Load benchmark for any provider registered with the ClientFactory. It
+# streams completions through astream_completion at a sweep of concurrency
+# levels, prompt lengths and output lengths, and reports for each
+# combination:
+#
+#   throughput      requests/sec and output tokens/sec over the wall clock
+#   ttft            time to first token
+#   itl             inter-token latency: the gaps between streamed chunks
+#   tpot            time per output token after the first, per request
+#   latency         request start to last token
+#   error rate      and the errors by type
+#
+# as p50/p95/p99 in a summary table and, with --output, as JSON. Each
+# concurrency level is a closed loop: that many requests are kept in flight
+# until --requests have completed. Run it before a model or hardware change
+# to pick the concurrency settings.
+#
+# python evaluation/load_benchmark.py --provider ollama --model mistral \
+#        --concurrency 1 2 4 8 --prompt-tokens 128 1024 --max-tokens 256
+#
+# python evaluation/load_benchmark.py --provider openai --model mock --mock \
+#        --concurrency 1 8 32 128 --output bench.json
+#
+# --mock runs evaluation/mock_llm_server.py in-process, so the numbers then
+# measure the client side: the factory, the adapters and the event loop.
+#
+
+SYSTEM_CONTENT = "You are a helpful assistant."
+
+_FILLER = ("Large language models generate text one token at a time, and the time a user waits "
+           "depends on how long the prompt takes to process, how many requests share the same "
+           "hardware, and how fast each new token is decoded. ").split()
+
+@dataclass
+class RequestResult:
+    ttft: Optional[float] = None
+    latency: Optional[float] = None
+    completion_tokens: int = 0
+    gaps: List[float] = None
+    error: Optional[str] = None
+
+    @property
+    def tpot(self) -> Optional[float]:
+        if self.ttft is None or self.completion_tokens < 2:
+            return None
+        return (self.latency - self.ttft) / (self.completion_tokens - 1)
+
+@lru_cache(maxsize=None)
+def _notes(prompt_tokens: int, model: Optional[str]) -> str:
+    words = []
+    filler = itertools.cycle(_FILLER)
+    while estimate_tokens(" ".join(words), model) < prompt_tokens:
+        words.extend(next(filler) for _ in range(32))
+    return " ".join(words)
+
+def make_prompt(index: int, prompt_tokens: int, max_tokens: int, model: Optional[str] = None) -> str:
+    """
+    A prompt of about prompt_tokens tokens that asks for a long answer.
+    It starts with the request index, so provider-side prefix caching
+    does not make repeated prompts look faster than they are.
+    """
+    return (f"Request {index}: write at least {max_tokens} words about the notes below.\n"
+            f"Notes: {_notes(prompt_tokens, model)}")
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def pct(p):
+        rank = (len(ordered) - 1) * p / 100.0
+        lower = int(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+    return {"mean": sum(ordered) / len(ordered), "p50": pct(50), "p95": pct(95), "p99": pct(99)}
+
+async def run_request(clnt: object, model: str, user_content: str,
+                      max_tokens: int, temperature: float) -> RequestResult:
+    result = RequestResult(gaps=[])
+    start = last = time.perf_counter()
+    chunks = 0
+    usage = None
+    try:
+        async for chunk in astream_completion(clnt, model, SYSTEM_CONTENT, user_content,
+                                              temperature=temperature, max_tokens=max_tokens):
+            now = time.perf_counter()
+            if chunk.done:
+                usage = chunk.usage
+            elif chunk.text:
+                if result.ttft is None:
+                    result.ttft = now - start
+                else:
+                    result.gaps.append(now - last)
+                last = now
+                chunks += 1
+    except Exception as e:
+        result.error = type(e).__name__
+        return result
+    result.latency = last - start
+    # providers that send several tokens per chunk report the true count in usage
+    result.completion_tokens = (usage or {}).get("completion_tokens") or chunks
+    return result
+
+async def run_level(clnt: object, model: str, concurrency: int, requests: int,
+                    prompt_tokens: int, max_tokens: int, temperature: float) -> Dict[str, object]:
+    """
+    Keep concurrency requests in flight until requests have completed,
+    and summarize them.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    prompts = [make_prompt(i, prompt_tokens, max_tokens, model) for i in range(requests)]
+
+    async def bounded(user_content):
+        async with semaphore:
+            return await run_request(clnt, model, user_content, max_tokens, temperature)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(bounded(p) for p in prompts))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if r.error is None]
+    output_tokens = sum(r.completion_tokens for r in ok)
+    return {"concurrency": concurrency,
+            "prompt_tokens": prompt_tokens,
+            "max_tokens": max_tokens,
+            "requests": len(results),
+            "errors": len(results) - len(ok),
+            "error_rate": (len(results) - len(ok)) / len(results),
+            "errors_by_type": dict(Counter(r.error for r in results if r.error)),
+            "wall_seconds": wall,
+            "requests_per_sec": len(ok) / wall,
+            "output_tokens_per_sec": output_tokens / wall,
+            "ttft": _percentiles([r.ttft for r in ok if r.ttft is not None]),
+            "itl": _percentiles([gap for r in ok for gap in r.gaps]),
+            "tpot": _percentiles([r.tpot for r in ok if r.tpot is not None]),
+            "latency": _percentiles([r.latency for r in ok])}
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+def print_table(runs: List[Dict[str, object]]) -> None:
+    header = (f"{'conc':>5} {'prompt':>7} {'max_out':>7} {'req/s':>7} {'tok/s':>8} "
+              f"{'ttft p50':>9} {'p95':>6} {'p99':>6} {'itl p50':>8} {'p99':>6} "
+              f"{'lat p50':>8} {'p95':>6} {'p99':>6} {'err%':>5}")
+    print(header)
+    print("-" * len(header))
+    for run in runs:
+        ttft, itl, latency = run["ttft"], run["itl"], run["latency"]
+        print(f"{run['concurrency']:>5} {run['prompt_tokens']:>7} {run['max_tokens']:>7} "
+              f"{run['requests_per_sec']:>7.2f} {run['output_tokens_per_sec']:>8.1f} "
+              f"{_ms(ttft['p50']):>9} {_ms(ttft['p95']):>6} {_ms(ttft['p99']):>6} "
+              f"{_ms(itl['p50']):>8} {_ms(itl['p99']):>6} "
+              f"{_ms(latency['p50']):>8} {_ms(latency['p95']):>6} {_ms(latency['p99']):>6} "
+              f"{run['error_rate'] * 100:>5.1f}")
+    print("(times in ms)")
+
+def client_kwargs(provider: str, base_url: Optional[str], model: str) -> Dict[str, object]:
+    if provider == 'google':
+        return {"model_name": model}
+    kwargs = {}
+    if base_url:
+        kwargs["host" if provider == 'ollama' else "base_url"] = base_url
+    if provider in ('openai', 'anthropic'):
+        # the SDKs retry 429s and 5xx on their own; every error must be
+        # counted, and its latency kept out of the success percentiles
+        kwargs["max_retries"] = 0
+    return kwargs
+
+async def benchmark(args, base_url: Optional[str], extra_kwargs: Dict[str, object]) -> List[Dict[str, object]]:
+    client_factory = ClientFactory(max_connections=max(args.concurrency))
+    client_name = args.provider if args.provider == 'google' else f"async_{args.provider}"
+    client_factory.register_client(client_name)
+    clnt = client_factory.get_client(client_name, **client_kwargs(args.provider, base_url, args.model),
+                                     **extra_kwargs)
+    runs = []
+    try:
+        if args.warmup:
+            # load the model and open a connection before anything is timed
+            await run_level(clnt, args.model, 1, args.warmup, args.prompt_tokens[0], 16, args.temperature)
+        for prompt_tokens in args.prompt_tokens:
+            for max_tokens in args.max_tokens:
+                for concurrency in args.concurrency:
+                    requests = max(args.requests, concurrency)
+                    print(f"Running concurrency={concurrency} prompt_tokens={prompt_tokens} "
+                          f"max_tokens={max_tokens} requests={requests}...", file=sys.stderr)
+                    runs.append(await run_level(clnt, args.model, concurrency, requests,
+                                                prompt_tokens, max_tokens, args.temperature))
+    finally:
+        await client_factory.aclose()
+    return runs
+
+if __name__ == "__main__":
+    _ = load_dotenv(find_dotenv())
+    parser = argparse.ArgumentParser(description="Load benchmark for LLM endpoints through the client factory")
+    parser.add_argument("--provider", default="ollama", choices=["openai", "anthropic", "ollama", "google"])
+    parser.add_argument("--model", default=os.getenv("MODEL"), help="model to benchmark (env MODEL)")
+    parser.add_argument("--base-url", default=None, help="base url of an OpenAI-compatible endpoint or Ollama host")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--prompt-tokens", type=int, nargs="+", default=[128])
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[128])
+    parser.add_argument("--requests", type=int, default=32,
+                        help="requests per level (at least the concurrency)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed requests sent before the sweep")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--mock", action="store_true", help="benchmark against an in-process mock server")
+    parser.add_argument("--mock-ttft", default="lognormal:0.2,0.3", help="mock server TTFT distribution")
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=50.0)
+    args = parser.parse_args()
+
+    if not args.model:
+        sys.exit("Please pass --model or set the MODEL environment")
+
+    mock_server = None
+    base_url = args.base_url
+    extra_kwargs = {}
+    if args.mock:
+        from mock_llm_server import MockConfig, MockLLMServer
+        if args.provider == 'google':
+            sys.exit("The mock server does not serve the Gemini API")
+        mock_server = MockLLMServer(MockConfig(ttft=args.mock_ttft, tokens_per_sec=args.mock_tokens_per_sec,
+                                               output_tokens=max(args.max_tokens))).start()
+        base_url = f"{mock_server.url}/v1" if args.provider == 'openai' else mock_server.url
+        if args.provider != 'ollama':
+            extra_kwargs["api_key"] = "mock"
+
+    started = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    try:
+        runs = asyncio.run(benchmark(args, base_url, extra_kwargs))
+    finally:
+        if mock_server is not None:
+            mock_server.stop()
+
+    print_table(runs)
+    if args.output:
+        report = {"provider": args.provider,
+                  "model": args.model,
+                  "base_url": base_url,
+                  "mock": args.mock,
+                  "started": started,
+                  "runs": runs}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
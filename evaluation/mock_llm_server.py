@@ -0,0 +1,565 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+#
+# A local stand-in for the OpenAI, Anthropic and Ollama HTTP APIs, for
+# benchmarking the client factory, the function-calling scripts and the
+# DSPy pipelines without live endpoints or a network. It serves
+#
+#   POST /v1/chat/completions   OpenAI chat completions (SSE when stream=true)
+#   POST /v1/messages           Anthropic messages (SSE when stream=true)
+#   POST /api/chat              Ollama chat (NDJSON, streams by default)
+#   POST /api/generate          Ollama generate (NDJSON, streams by default)
+#   GET  /stats                 request, token and error counts
+#
+# Outputs are deterministic: the same prompt always gets the same text,
+# either a canned response (--responses) or pseudo-text seeded by a hash
+# of the prompt. Latency is a time-to-first-token drawn from a configurable
+# distribution, plus an optional prefill cost per prompt token, followed by
+# tokens at a fixed rate. Errors can be injected as HTTP failures or as
+# streams cut off half way. A "token" here is one whitespace-separated word.
+#
+# python evaluation/mock_llm_server.py --port 8000 --ttft lognormal:0.3,0.5 \
+#        --tokens-per-sec 40 --error-rate 0.02 --error-status 429
+#
+# Point the SDKs at it with a dummy key:
+#
+#   OpenAI(base_url="http://127.0.0.1:8000/v1", api_key="mock")
+#   Anthropic(base_url="http://127.0.0.1:8000", api_key="mock")
+#   ollama.Client(host="http://127.0.0.1:8000")
+#
+
+class LatencyDistribution:
+    """
+    Parse a latency spec in seconds and sample from it:
+
+        0.2 or fixed:0.2          always 0.2
+        uniform:0.1,0.5           uniform between 0.1 and 0.5
+        normal:0.3,0.05           mean, standard deviation (clipped at 0)
+        lognormal:0.3,0.5         median, sigma of the underlying normal
+        exponential:0.3           mean
+    """
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        try:
+            params = [float(a) for a in args.split(",")]
+        except ValueError:
+            raise ValueError(f"Bad latency spec '{spec}'")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Bad latency spec '{spec}'")
+        self.kind = kind
+        self.params = params
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return rng.expovariate(1.0 / self.params[0]) if self.params[0] > 0 else 0.0
+
+@dataclass
+class MockConfig:
+    """
+    ttft is a LatencyDistribution spec. prefill_tokens_per_sec adds
+    prompt_tokens / prefill_tokens_per_sec to the TTFT when set.
+    output_tokens is the length of generated (non-canned) responses, cut
+    short by the request's max_tokens. error_rate is the fraction of
+    requests answered with error_status; abort_rate the fraction of
+    streams that are dropped after half their tokens. parallel, when set,
+    is how many requests are served at once; the rest queue, as they do on
+    an Ollama server with OLLAMA_NUM_PARALLEL. seed makes the latency and
+    error draws repeatable.
+    """
+    ttft: str = "fixed:0.05"
+    tokens_per_sec: float = 50.0
+    prefill_tokens_per_sec: Optional[float] = None
+    output_tokens: int = 64
+    error_rate: float = 0.0
+    error_status: int = 500
+    abort_rate: float = 0.0
+    parallel: Optional[int] = None
+    seed: int = 0
+    responses: Dict[str, str] = field(default_factory=dict)
+    verbose: bool = False
+
+_WORDS = ("the model returns a token stream with latency and throughput measured "
+          "across every request while the client factory keeps connections warm "
+          "so prompts complete quickly under load and errors are retried").split()
+
+def _tokenize(text: str) -> List[str]:
+    # keep the leading whitespace on each token, so the
+    # streamed pieces join back into the original text
+    return re.findall(r"\s*\S+", text)
+
+def _count_tokens(text: str) -> int:
+    return len(re.findall(r"\S+", text))
+
+def _content_text(content) -> str:
+    # message content is a string, or a list of blocks in the
+    # Anthropic and OpenAI multi-part formats
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return ""
+
+@dataclass
+class _Request:
+    model: str
+    prompt: str
+    max_tokens: Optional[int]
+    stream: bool
+    include_usage: bool = False
+    received_at: float = field(default_factory=time.perf_counter)
+    # set by the handler: when generation started, after any queueing,
+    # and when the first token was ready
+    started_at: Optional[float] = None
+    first_token_at: Optional[float] = None
+
+class _Dialect:
+    """
+    Request parsing and response shapes for one provider API.
+    """
+    content_type = "text/event-stream"
+
+    def parse(self, body: Dict) -> _Request:
+        raise NotImplementedError
+
+    def response(self, request: _Request, text: str, usage: Tuple[int, int], finish: str) -> Dict:
+        raise NotImplementedError
+
+    def stream_events(self, request: _Request, tokens: Iterator[str],
+                      prompt_tokens: int, finish: str) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def error(self, status: int) -> Dict:
+        raise NotImplementedError
+
+def _sse(data: Dict, event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode()
+
+class _OpenAIChat(_Dialect):
+    def parse(self, body):
+        prompt = "\n".join(_content_text(m.get("content")) for m in body.get("messages", []))
+        return _Request(model=body.get("model", "mock"), prompt=prompt,
+                        max_tokens=body.get("max_tokens") or body.get("max_completion_tokens"),
+                        stream=bool(body.get("stream")),
+                        include_usage=bool((body.get("stream_options") or {}).get("include_usage")))
+
+    @staticmethod
+    def _usage(prompt_tokens, completion_tokens):
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def response(self, request, text, usage, finish):
+        return {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion",
+                "created": int(time.time()), "model": request.model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": finish}],
+                "usage": self._usage(*usage)}
+
+    def stream_events(self, request, tokens, prompt_tokens, finish):
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.model}
+
+        def chunk(delta, finish_reason=None):
+            return _sse({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]})
+
+        yield chunk({"role": "assistant", "content": ""})
+        completion_tokens = 0
+        for token in tokens:
+            completion_tokens += 1
+            yield chunk({"content": token})
+        yield chunk({}, finish)
+        if request.include_usage:
+            yield _sse({**base, "choices": [], "usage": self._usage(prompt_tokens, completion_tokens)})
+        yield b"data: [DONE]\n\n"
+
+    def error(self, status):
+        kind = {429: "rate_limit_exceeded", 503: "server_overloaded"}.get(status, "server_error")
+        return {"error": {"message": f"Injected {status} error", "type": kind, "code": kind}}
+
+class _AnthropicMessages(_Dialect):
+    def parse(self, body):
+        system = _content_text(body.get("system", ""))
+        messages = "\n".join(_content_text(m.get("content")) for m in body.get("messages", []))
+        return _Request(model=body.get("model", "mock"), prompt=f"{system}\n{messages}",
+                        max_tokens=body.get("max_tokens"), stream=bool(body.get("stream")))
+
+    @staticmethod
+    def _stop_reason(finish):
+        return "max_tokens" if finish == "length" else "end_turn"
+
+    def response(self, request, text, usage, finish):
+        return {"id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant",
+                "model": request.model, "content": [{"type": "text", "text": text}],
+                "stop_reason": self._stop_reason(finish), "stop_sequence": None,
+                "usage": {"input_tokens": usage[0], "output_tokens": usage[1]}}
+
+    def stream_events(self, request, tokens, prompt_tokens, finish):
+        message = {"id": f"msg_{uuid.uuid4().hex}", "type": "message", "role": "assistant",
+                   "model": request.model, "content": [], "stop_reason": None, "stop_sequence": None,
+                   "usage": {"input_tokens": prompt_tokens, "output_tokens": 1}}
+        yield _sse({"type": "message_start", "message": message}, "message_start")
+        yield _sse({"type": "content_block_start", "index": 0,
+                    "content_block": {"type": "text", "text": ""}}, "content_block_start")
+        completion_tokens = 0
+        for token in tokens:
+            completion_tokens += 1
+            yield _sse({"type": "content_block_delta", "index": 0,
+                        "delta": {"type": "text_delta", "text": token}}, "content_block_delta")
+        yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield _sse({"type": "message_delta",
+                    "delta": {"stop_reason": self._stop_reason(finish), "stop_sequence": None},
+                    "usage": {"output_tokens": completion_tokens}}, "message_delta")
+        yield _sse({"type": "message_stop"}, "message_stop")
+
+    def error(self, status):
+        kind = {429: "rate_limit_error", 529: "overloaded_error", 503: "overloaded_error"}.get(status, "api_error")
+        return {"type": "error", "error": {"type": kind, "message": f"Injected {status} error"}}
+
+class _OllamaChat(_Dialect):
+    content_type = "application/x-ndjson"
+
+    def parse(self, body):
+        prompt = "\n".join(_content_text(m.get("content")) for m in body.get("messages", []))
+        return _Request(model=body.get("model", "mock"), prompt=prompt,
+                        max_tokens=(body.get("options") or {}).get("num_predict"),
+                        stream=body.get("stream", True))
+
+    def _content(self, text):
+        return {"message": {"role": "assistant", "content": text}}
+
+    def _final(self, request, usage, finish, first_token_at):
+        # like Ollama: prompt_eval_duration is the time to the first token,
+        # eval_duration the time from there to the last, and
+        # total_duration everything since the request arrived
+        end = time.perf_counter()
+        first_token_at = first_token_at or end
+        started_at = request.started_at or request.received_at
+        return {"model": request.model, "created_at": _now(), "done": True,
+                "done_reason": "length" if finish == "length" else "stop",
+                "total_duration": int((end - request.received_at) * 1e9), "load_duration": 0,
+                "prompt_eval_count": usage[0],
+                "prompt_eval_duration": int((first_token_at - started_at) * 1e9),
+                "eval_count": usage[1], "eval_duration": int((end - first_token_at) * 1e9)}
+
+    def response(self, request, text, usage, finish):
+        return {**self._final(request, usage, finish, request.first_token_at), **self._content(text)}
+
+    def stream_events(self, request, tokens, prompt_tokens, finish):
+        completion_tokens = 0
+        first_token_at = None
+        for token in tokens:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            completion_tokens += 1
+            yield (json.dumps({"model": request.model, "created_at": _now(),
+                               **self._content(token), "done": False}) + "\n").encode()
+        final = {**self._final(request, (prompt_tokens, completion_tokens), finish, first_token_at),
+                 **self._content("")}
+        yield (json.dumps(final) + "\n").encode()
+
+    def error(self, status):
+        return {"error": f"Injected {status} error"}
+
+class _OllamaGenerate(_OllamaChat):
+    def parse(self, body):
+        prompt = f"{body.get('system', '')}\n{body.get('prompt', '')}"
+        return _Request(model=body.get("model", "mock"), prompt=prompt,
+                        max_tokens=(body.get("options") or {}).get("num_predict"),
+                        stream=body.get("stream", True))
+
+    def _content(self, text):
+        return {"response": text}
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+_ROUTES = {"/v1/chat/completions": _OpenAIChat(),
+           "/chat/completions": _OpenAIChat(),
+           "/v1/messages": _AnthropicMessages(),
+           "/api/chat": _OllamaChat(),
+           "/api/generate": _OllamaGenerate()}
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive, as the SDKs' pooled clients
+    # expect; streams are sent with chunked transfer encoding
+    protocol_version = "HTTP/1.1"
+    # send each token as soon as it is written: with Nagle's algorithm
+    # and delayed ACKs a small write can wait ~40 ms, skewing the TTFT
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # a pooled client dropped an idle keep-alive connection
+            pass
+
+    def log_message(self, format, *args):
+        if self.server.config.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stats":
+            self._send_json(200, self.server.stats())
+        elif path in ("/", "/health"):
+            self._send_json(200, {"status": "ok"})
+        elif path == "/api/tags":
+            self._send_json(200, {"models": []})
+        else:
+            self._send_json(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self):
+        dialect = _ROUTES.get(self.path.split("?")[0])
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b""
+        if dialect is None:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            request = dialect.parse(json.loads(raw or b"{}"))
+        except (ValueError, AttributeError) as e:
+            self._send_json(400, {"error": f"Bad request body: {e}"})
+            return
+        try:
+            with self.server.slot():
+                self._serve(dialect, request)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client went away, e.g. a hedged request that lost the race
+            self.close_connection = True
+
+    def _serve(self, dialect: _Dialect, request: _Request) -> None:
+        server = self.server
+        status, abort, ttft = server.draw(request.prompt)
+        if status:
+            headers = {"Retry-After": "1"} if status == 429 else None
+            self._send_json(status, dialect.error(status), headers)
+            return
+        tokens, finish = server.completion(request.prompt, request.max_tokens)
+        prompt_tokens = _count_tokens(request.prompt)
+        start = request.started_at = time.perf_counter()
+        interval = 1.0 / server.config.tokens_per_sec if server.config.tokens_per_sec > 0 else 0.0
+
+        if not request.stream:
+            time.sleep(ttft)
+            request.first_token_at = time.perf_counter()
+            time.sleep(interval * max(len(tokens) - 1, 0))
+            server.count(completion_tokens=len(tokens))
+            self._send_json(200, dialect.response(request, "".join(tokens).lstrip(),
+                                                  (prompt_tokens, len(tokens)), finish))
+            return
+
+        cut_at = len(tokens) // 2 if abort else None
+
+        def paced():
+            for i, token in enumerate(tokens):
+                if i == cut_at:
+                    raise _Abort()
+                # schedule against the start time so sleep overshoot
+                # does not add up over a long response
+                delay = start + ttft + i * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                server.count(completion_tokens=1)
+                yield token.lstrip() if i == 0 else token
+
+        self.send_response(200)
+        self.send_header("Content-Type", dialect.content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for event in dialect.stream_events(request, paced(), prompt_tokens, finish):
+                self._write_chunk(event)
+        except _Abort:
+            # drop the connection without the terminating chunk, the
+            # way a crashed upstream or a proxy timeout looks to the client
+            server.count(aborts=1)
+            self.close_connection = True
+            return
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+class _Abort(Exception):
+    pass
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    The mock server. Run it from the command line, or in a background
+    thread from a benchmark or script:
+
+        with MockLLMServer(MockConfig(ttft="uniform:0.1,0.3", tokens_per_sec=80)) as server:
+            clnt = OpenAI(base_url=f"{server.url}/v1", api_key="mock")
+            ...
+            print(server.stats())
+    """
+    daemon_threads = True
+    # allow a deep accept backlog for concurrency sweeps
+    request_queue_size = 1024
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.config = config or MockConfig()
+        self._ttft = LatencyDistribution(self.config.ttft)
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.config.parallel) if self.config.parallel else None
+        self._thread = None
+        self._counts = {"requests": 0, "errors": 0, "aborts": 0, "completion_tokens": 0,
+                        "in_flight": 0, "max_in_flight": 0, "queued": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self, prompt: str) -> Tuple[Optional[int], bool, float]:
+        """
+        Draw one request's fate: an error status or None, whether its
+        stream is cut off, and its time to first token.
+        """
+        with self._lock:
+            self._counts["requests"] += 1
+            status = self.config.error_status if self._rng.random() < self.config.error_rate else None
+            if status:
+                self._counts["errors"] += 1
+            abort = self._rng.random() < self.config.abort_rate
+            ttft = self._ttft.sample(self._rng)
+        if self.config.prefill_tokens_per_sec:
+            ttft += _count_tokens(prompt) / self.config.prefill_tokens_per_sec
+        return status, abort, ttft
+
+    def completion(self, prompt: str, max_tokens: Optional[int]) -> Tuple[List[str], str]:
+        """
+        The response tokens for prompt and the finish reason, "length"
+        when max_tokens cut it short.
+        """
+        text = next((response for key, response in self.config.responses.items() if key in prompt), None)
+        if text is None:
+            seed = int(hashlib.sha256(prompt.encode()).hexdigest()[:16], 16)
+            rng = random.Random(seed)
+            words = [rng.choice(_WORDS) for _ in range(self.config.output_tokens)]
+            text = " ".join(words).capitalize() + "."
+        tokens = _tokenize(text)
+        if max_tokens is not None and len(tokens) > max_tokens:
+            return tokens[:max_tokens], "length"
+        return tokens, "stop"
+
+    def count(self, **increments: int) -> None:
+        with self._lock:
+            for name, n in increments.items():
+                self._counts[name] += n
+
+    @contextmanager
+    def slot(self):
+        if self._slots is not None:
+            self.count(queued=1)
+            self._slots.acquire()
+            self.count(queued=-1)
+        with self._lock:
+            self._counts["in_flight"] += 1
+            self._counts["max_in_flight"] = max(self._counts["max_in_flight"], self._counts["in_flight"])
+        try:
+            yield
+        finally:
+            self.count(in_flight=-1)
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {**self._counts, "ttft": self.config.ttft,
+                    "tokens_per_sec": self.config.tokens_per_sec}
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI, Anthropic and Ollama endpoints for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ttft", default="fixed:0.05",
+                        help="time-to-first-token distribution, e.g. 0.2, uniform:0.1,0.5, lognormal:0.3,0.5")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="output token rate per request")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=None,
+                        help="add prompt_tokens / this rate to the TTFT")
+    parser.add_argument("--output-tokens", type=int, default=64, help="length of generated responses")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected errors, e.g. 429")
+    parser.add_argument("--abort-rate", type=float, default=0.0,
+                        help="fraction of streams dropped half way through")
+    parser.add_argument("--parallel", type=int, default=None,
+                        help="requests served at once; the rest queue")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--responses", default=None,
+                        help="JSON file mapping a prompt substring to a canned response")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    responses = {}
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+    config = MockConfig(ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+                        prefill_tokens_per_sec=args.prefill_tokens_per_sec,
+                        output_tokens=args.output_tokens, error_rate=args.error_rate,
+                        error_status=args.error_status, abort_rate=args.abort_rate,
+                        parallel=args.parallel, seed=args.seed, responses=responses,
+                        verbose=args.verbose)
+    server = MockLLMServer(config, args.host, args.port)
+    print(f"Mock LLM server on {server.url} (ttft={config.ttft}, tokens/sec={config.tokens_per_sec})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
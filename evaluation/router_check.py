@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, "llm-prompts")
+
+from llm_clnt_factory_api import ClientFactory
+from llm_router import HedgedRouter, RouteTarget
+from mock_llm_server import MockConfig, MockLLMServer
+
+#
+# Exercise the HedgedRouter against three in-process mock endpoints: a
+# fast one, a slow one and one that fails every request. No API keys or
+# network needed. It checks that the router settles on the fast endpoint,
+# hedges away from the slow one, and stops paying a failed round trip to
+# the broken one on every request, and exits non-zero if it does not.
+#
+# python evaluation/router_check.py --requests 40
+#
+
+async def main(args) -> int:
+    configs = {"fast": MockConfig(ttft="fixed:0.05", tokens_per_sec=500, output_tokens=8),
+               "slow": MockConfig(ttft="fixed:1.0", tokens_per_sec=500, output_tokens=8),
+               "broken": MockConfig(ttft="fixed:0.05", error_rate=1.0, error_status=503)}
+    servers = {name: MockLLMServer(config).start() for name, config in configs.items()}
+    client_factory = ClientFactory()
+    client_factory.register_client("async_openai")
+    try:
+        # the broken endpoint comes first, so it is tried before anything is measured
+        targets = [RouteTarget(name, client_factory.get_client("async_openai", api_key="mock",
+                                                               base_url=f"{servers[name].url}/v1",
+                                                               max_retries=0), "mock")
+                   for name in ("broken", "slow", "fast")]
+        router = HedgedRouter(targets, default_hedge_delay=0.3, min_samples=3,
+                              failure_cooldown=args.failure_cooldown)
+        winners = Counter()
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            await router.acomplete("You are a helpful assistant.", "Say something.", max_tokens=8)
+            winners[router.ranked()[0].name] += 1
+        wall = time.perf_counter() - start
+        stats = router.stats()
+        requests = {name: server.stats()["requests"] for name, server in servers.items()}
+    finally:
+        await client_factory.aclose()
+        for server in servers.values():
+            server.stop()
+
+    print(f"{args.requests} requests in {wall:.2f}s")
+    for name, target_stats in stats["targets"].items():
+        print(f"  {name:<7} requests={requests[name]:<4} failures={target_stats['failures']:<4} "
+              f"p50_ttft={target_stats['p50_ttft']}")
+    print(f"  hedges fired={stats['hedges_fired']} won={stats['hedges_won']}")
+
+    # one failure per cooldown period, at most, once the broken target is ranked last
+    allowed_failures = 1 + int(wall // args.failure_cooldown)
+    problems = []
+    if stats["targets"]["broken"]["failures"] > allowed_failures:
+        problems.append(f"broken endpoint failed {stats['targets']['broken']['failures']} times, "
+                        f"expected at most {allowed_failures}")
+    if winners["fast"] < args.requests // 2:
+        problems.append(f"fast endpoint ranked first after only {winners['fast']} of {args.requests} requests")
+    if stats["hedges_won"] > stats["hedges_fired"]:
+        problems.append(f"{stats['hedges_won']} hedges won but only {stats['hedges_fired']} fired")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check HedgedRouter routing against mock endpoints")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--failure-cooldown", type=float, default=30.0)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
@@ -35,29 +35,58 @@ import os
 import warnings
 from dotenv import load_dotenv, find_dotenv
 from typing import Dict, Any
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+import sys
+sys.path.insert(0, "llm-prompts")
+from llm_clnt_factory_api import ClientFactory
+from llm_circuit_breaker import CircuitOpenError, is_endpoint_failure
+from tenacity import retry, retry_if_exception, stop_after_attempt, stop_after_delay, wait_random_exponential
 from customer_db_utils import  execute_function_call, get_database_schema, connect_db
 from termcolor import colored
 
 
-@retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
+# one circuit breaker per endpoint, shared by every request in the process
+client_factory = ClientFactory()
+
+def _should_retry(e: BaseException) -> bool:
+    # an open breaker or a bad request will not get better by retrying
+    return not isinstance(e, CircuitOpenError) and is_endpoint_failure(e)
+
+@retry(wait=wait_random_exponential(multiplier=1, max=4),
+       stop=(stop_after_attempt(3) | stop_after_delay(10)),
+       retry=retry_if_exception(_should_retry),
+       reraise=True)
+def _create_chat_completion(clnt: object, **kwargs):
+    return client_factory.circuit_breaker(clnt).call(clnt.chat.completions.create, **kwargs)
+
 def chat_completion_request(clnt:object, messages:object,
                              tools=None, tool_choice=None, 
-                             model='gpt-4-1106-preview'):
+                             model='gpt-4-1106-preview',
+                             fail_fast=False, fallback_clnt=None, fallback_model=None):
     """
-    Send a chat completion request to the OpenAI API."""
+    Send a chat completion request to the OpenAI API.
+
+    Requests go through the endpoint's circuit breaker, shared through the
+    client factory. Transient errors are retried twice within about ten
+    seconds, or not at all with fail_fast=True; an open breaker is never
+    retried. If the breaker is open or the request still fails, it goes
+    to fallback_clnt (with fallback_model) when one is given; otherwise
+    the exception is raised to the caller.
+    """
+    kwargs = {"model": model, "messages": messages, "tools": tools, "tool_choice": tool_choice}
     try:
-        response = clnt.chat.completions.create(
-            model=model,
-            messages=messages,
-            tools=tools,
-            tool_choice=tool_choice,
-        )
-        return response
+        if fail_fast:
+            response = client_factory.circuit_breaker(clnt).call(clnt.chat.completions.create, **kwargs)
+        else:
+            response = _create_chat_completion(clnt, **kwargs)
     except Exception as e:
         print("Unable to generate ChatCompletion response")
         print(f"Exception: {e}")
-        return e
+        if fallback_clnt is None:
+            raise
+        print(f"Falling back to {fallback_model or model} at {fallback_clnt.base_url}")
+        response = client_factory.circuit_breaker(fallback_clnt).call(
+            fallback_clnt.chat.completions.create, **{**kwargs, "model": fallback_model or model})
+    return response
 
 conn = connect_db("customers.db")
 database_schema_string = get_database_schema(conn)
@@ -131,7 +160,9 @@ def get_answer(client: object,
         chat_response = chat_completion_request(client, messages, tools,
                                             tool_choice={"type": "function", 
                                                           "function": {"name": "query_customer_database"}},
-                                            model=MODEL)
+                                            model=MODEL,
+                                            fallback_clnt=fallback_client,
+                                            fallback_model=os.getenv("FALLBACK_MODEL"))
 
        # Get the message returned by the model
         assistant_message = chat_response.choices[0].message
@@ -163,6 +194,13 @@ if __name__ == "__main__":
         base_url = openai.api_base
     )
 
+    # optional second OpenAI-compatible endpoint to divert to while the
+    # first one is failing, e.g. Anyscale Endpoints as a backup for OpenAI
+    fallback_client = None
+    if os.getenv("FALLBACK_API_BASE"):
+        fallback_client = OpenAI(api_key=os.getenv("FALLBACK_API_KEY"),
+                                 base_url=os.getenv("FALLBACK_API_BASE"))
+
      # Streamlit app
     st.title('Question and Answer with LLM and Customers SQLite Database')
 
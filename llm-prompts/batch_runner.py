@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from dotenv import load_dotenv, find_dotenv
+
+from llm_clnt_factory_api import ClientFactory, get_commpletion
+from llm_rate_limiter import RateLimiter
+from llm_response_cache import ResponseCache
+
+#
+# Offline batch runner: stream a JSONL file of completion requests through
+# the client factory with bounded concurrency, appending one result line
+# per request to an output JSONL file. The output file is also the
+# checkpoint: on restart, lines already answered there are skipped, so a
+# crashed overnight job picks up where it died instead of starting over.
+#
+# python llm-prompts/batch_runner.py requests.jsonl results.jsonl \
+#        --provider openai --model gpt-4-turbo-preview --max-concurrency 16 \
+#        --user-field title body --id-field request_id
+#
+# Each input line is a JSON object. The prompt is read from --user-field
+# (several fields are joined with blank lines); "system_content" and
+# "model" on a line override the command-line defaults. Output lines hold
+# the input line number, its id, and either "response" or "error". On
+# resume, failed lines are retried and their old "error" lines removed
+# from the output, so it holds at most one line per input line.
+#
+
+def read_requests(path: str) -> Iterator[Tuple[int, Dict]]:
+    with open(path) as f:
+        for line_no, line in enumerate(f):
+            line = line.strip()
+            if line:
+                yield line_no, json.loads(line)
+
+def load_checkpoint(path: str, retry_errors: bool) -> Set[int]:
+    """
+    Return the input line numbers already answered in the output file.
+    Cut off a partly written last line left behind by a crash, and, so
+    the file keeps one record per input line, drop the error records of
+    lines about to be retried and any older records of the same line.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    # first pass: find the latest record of each input line
+    valid_size = 0
+    latest = {}
+    records = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except json.JSONDecodeError:
+                break
+            valid_size += len(raw)
+            latest[record["line"]] = (records, "response" in record)
+            records += 1
+    keep = {index for index, answered in latest.values() if answered or not retry_errors}
+    done = {line for line, (index, _) in latest.items() if index in keep}
+    if len(keep) == records:
+        if valid_size != os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(valid_size)
+        return done
+    # second pass: rewrite the file with only the records kept, streaming
+    # it rather than holding every response in memory
+    tmp_path = f"{path}.tmp"
+    with open(path, "rb") as f, open(tmp_path, "wb") as out:
+        for index in range(records):
+            raw = f.readline()
+            if index in keep:
+                out.write(raw)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+    return done
+
+def create_client(provider: str, base_url: Optional[str], model: str):
+    client_factory = ClientFactory()
+    client_factory.register_client(provider)
+    if provider == 'google':
+        return client_factory.create_client(provider, model_name=model)
+    client_kwargs = {}
+    if base_url:
+        client_kwargs["host" if provider == 'ollama' else "base_url"] = base_url
+    return client_factory.create_client(provider, **client_kwargs)
+
+class BatchRunner:
+    def __init__(self, clnt: object, model: str, system_content: str, user_fields: list,
+                 id_field: str = "request_id", max_concurrency: int = 8, fsync_every: int = 50,
+                 cache: Optional[ResponseCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 temperature: float = 0.8, max_tokens: Optional[int] = None):
+        self.clnt = clnt
+        self.model = model
+        self.system_content = system_content
+        self.user_fields = user_fields
+        self.id_field = id_field
+        self.max_concurrency = max_concurrency
+        self.fsync_every = fsync_every
+        self.completion_kwargs = {"temperature": temperature, "max_tokens": max_tokens,
+                                  "cache": cache, "rate_limiter": rate_limiter}
+        self.completed = 0
+        self.failed = 0
+
+    def _complete(self, line_no: int, request: Dict) -> Dict:
+        record = {"line": line_no, "id": request.get(self.id_field, line_no)}
+        try:
+            user_content = "\n\n".join(str(request[f]) for f in self.user_fields if f in request)
+            if not user_content:
+                raise ValueError(f"no {'/'.join(self.user_fields)} field on line {line_no}")
+            record["response"] = get_commpletion(self.clnt, request.get("model", self.model),
+                                                 request.get("system_content", self.system_content),
+                                                 user_content, **self.completion_kwargs)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    def run(self, input_path: str, output_path: str, retry_errors: bool = True) -> None:
+        done = load_checkpoint(output_path, retry_errors)
+        if done:
+            print(f"Resuming: {len(done)} lines already done in {output_path}")
+        started = time.perf_counter()
+        pending = set()
+        with open(output_path, "a") as out, ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            def drain(return_when):
+                nonlocal pending
+                finished, pending = wait(pending, return_when=return_when)
+                for future in finished:
+                    record = future.result()
+                    out.write(json.dumps(record) + "\n")
+                    if "error" in record:
+                        self.failed += 1
+                    else:
+                        self.completed += 1
+                    if (self.completed + self.failed) % self.fsync_every == 0:
+                        out.flush()
+                        os.fsync(out.fileno())
+                        self.report(started)
+
+            try:
+                for line_no, request in read_requests(input_path):
+                    if line_no in done:
+                        continue
+                    # keep the input streaming: never queue more than a
+                    # couple of requests per worker ahead of the results
+                    if len(pending) >= 2 * self.max_concurrency:
+                        drain(FIRST_COMPLETED)
+                    pending.add(executor.submit(self._complete, line_no, request))
+                drain(ALL_COMPLETED)
+            except KeyboardInterrupt:
+                print("\nInterrupted; finishing requests in flight...")
+                drain(ALL_COMPLETED)
+                raise
+            finally:
+                out.flush()
+                os.fsync(out.fileno())
+        self.report(started)
+
+    def report(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        total = self.completed + self.failed
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print(f"completed={self.completed} failed={self.failed} elapsed={elapsed:.1f}s rate={rate:.2f}/s")
+
+if __name__ == "__main__":
+    _ = load_dotenv(find_dotenv())
+    parser = argparse.ArgumentParser(description="Run a JSONL file of completion requests through the client factory")
+    parser.add_argument("input", help="input JSONL file of requests")
+    parser.add_argument("output", help="output JSONL file; also the checkpoint to resume from")
+    parser.add_argument("--provider", default="openai", choices=["openai", "anthropic", "ollama", "google"])
+    parser.add_argument("--model", default=os.getenv("MODEL"), help="default model (env MODEL)")
+    parser.add_argument("--base-url", default=None, help="base url of an OpenAI-compatible endpoint or Ollama host")
+    parser.add_argument("--system-content", default="You are a helpful assistant.")
+    parser.add_argument("--user-field", nargs="+", default=["user_content"],
+                        help="request field(s) holding the prompt")
+    parser.add_argument("--id-field", default="request_id")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--temperature", type=float, default=0.8)
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="by default, the provider's own limit (2500 for Anthropic, which needs one)")
+    parser.add_argument("--rpm", type=float, default=None, help="requests-per-minute budget")
+    parser.add_argument("--tpm", type=float, default=None, help="tokens-per-minute budget")
+    parser.add_argument("--cache", default=None, help="path of a ResponseCache SQLite file")
+    parser.add_argument("--no-retry-errors", action="store_true",
+                        help="on resume, do not retry lines that failed")
+    parser.add_argument("--fsync-every", type=int, default=50, help="flush output to disk every N results")
+    args = parser.parse_args()
+
+    if not args.model:
+        sys.exit("Please pass --model or set the MODEL environment")
+
+    runner = BatchRunner(create_client(args.provider, args.base_url, args.model),
+                         args.model, args.system_content, args.user_field,
+                         id_field=args.id_field,
+                         max_concurrency=args.max_concurrency,
+                         fsync_every=args.fsync_every,
+                         cache=ResponseCache(args.cache) if args.cache else None,
+                         rate_limiter=RateLimiter(args.rpm, args.tpm) if (args.rpm or args.tpm) else None,
+                         temperature=args.temperature,
+                         max_tokens=args.max_tokens)
+    runner.run(args.input, args.output, retry_errors=not args.no_retry_errors)
@@ -0,0 +1,68 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+#
+# Measure the cold-start cost of importing the client factory. Each
+# scenario runs in a fresh interpreter, the way a CLI invocation or a
+# serverless cold start would, and we report the median wall time.
+#
+# python llm-prompts/bench_import_time.py --repeat 10
+#
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SDKS = {"openai": "import openai",
+        "anthropic": "import anthropic",
+        "ollama": "import ollama",
+        "google": "import google.generativeai"}
+
+SCENARIOS = {
+    # what every importer of llm_clnt_factory_api used to pay
+    "eager: all four SDKs": "; ".join(SDKS.values()),
+    "lazy: import llm_clnt_factory_api": "import llm_clnt_factory_api",
+    "lazy: factory + ollama client": ("from llm_clnt_factory_api import ClientFactory; "
+                                      "f = ClientFactory(); f.register_client('ollama'); "
+                                      "f.create_client('ollama')"),
+}
+
+def time_import(statement: str, repeat: int) -> float:
+    """
+    Median wall time, in milliseconds, to run statement in a new interpreter.
+    """
+    code = ("import time; _t = time.perf_counter(); "
+            f"{statement}; "
+            "print((time.perf_counter() - _t) * 1000)")
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True,
+                             capture_output=True, text=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+def installed(statement: str) -> bool:
+    return subprocess.run([sys.executable, "-c", statement], cwd=HERE,
+                          capture_output=True).returncode == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark client factory import time")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per scenario")
+    args = parser.parse_args()
+
+    missing = [name for name, stmt in SDKS.items() if not installed(stmt)]
+    if missing:
+        print(f"Skipping scenarios that need missing SDKs: {', '.join(missing)}")
+
+    print(f"{'scenario':<40} {'median ms':>10}")
+    print('-' * 51)
+    for name, statement in SDKS.items():
+        if name not in missing:
+            print(f"{'sdk: ' + name:<40} {time_import(statement, args.repeat):>10.1f}")
+    for name, statement in SCENARIOS.items():
+        if name.startswith("eager") and missing:
+            continue
+        if "ollama" in statement and "ollama" in missing:
+            continue
+        print(f"{name:<40} {time_import(statement, args.repeat):>10.1f}")
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+#
+# Per-endpoint circuit breaker. During a provider incident, retrying every
+# request ties up request threads for tens of seconds each and queueing
+# latency explodes. A breaker watches the recent error rate of an
+# endpoint; once it is too high the breaker opens and calls fail at once
+# (or go to a fallback) instead of waiting on a sick endpoint. After a
+# cool-down it lets a trial call through ("half-open") and closes again
+# if that call succeeds.
+#
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling an endpoint whose circuit breaker is open.
+    """
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """
+    Whether error says the endpoint is unhealthy. Client errors such as a
+    bad request or a missing model (4xx) are the caller's problem and do
+    not count, except timeouts (408) and rate limiting (429).
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 429):
+        return False
+    return True
+
+class CircuitBreaker:
+    """
+    Opens when at least failure_rate of the last window calls failed, once
+    min_calls have been seen. While open, before_call() raises
+    CircuitOpenError. After open_seconds it goes half-open and lets up to
+    half_open_calls trial calls through: if they all succeed it closes,
+    if one fails it opens again, each time for twice as long, up to
+    max_open_seconds.
+
+        breaker = CircuitBreaker("openai", failure_rate=0.5)
+        response = breaker.call(client.chat.completions.create, model=..., messages=...,
+                                fallback=lambda **kwargs: backup.chat.completions.create(**kwargs))
+
+    ClientFactory.circuit_breaker() hands out one shared breaker per endpoint.
+    """
+    def __init__(self, name: str, failure_rate: float = 0.5, window: int = 20, min_calls: int = 5,
+                 open_seconds: float = 30.0, max_open_seconds: float = 300.0, half_open_calls: int = 1,
+                 is_failure: Callable[[BaseException], bool] = is_endpoint_failure):
+        if not 0 < failure_rate <= 1:
+            raise ValueError("failure_rate must be in (0, 1]")
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._open_for = open_seconds
+        self._trials = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self._open_for:
+            self._state = HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    def _open(self, now: float) -> None:
+        if self._state == HALF_OPEN:
+            # the endpoint is still sick; back off for longer
+            self._open_for = min(self._open_for * 2, self.max_open_seconds)
+        self._state = OPEN
+        self._opened_at = now
+        self.times_opened += 1
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the breaker will let a trial call through; 0 unless open.
+        """
+        with self._lock:
+            if self._current_state(time.monotonic()) != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._open_for - time.monotonic())
+
+    def before_call(self) -> None:
+        """
+        Raise CircuitOpenError if the call must not go to the endpoint.
+        Every call let through must be followed by on_success, on_failure,
+        or on_cancel if it ends with neither, e.g. cancelled or timed out.
+        """
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"Circuit breaker for '{self.name}' is open; "
+                               f"retry in {self.retry_after():.1f}s")
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trials -= 1
+                if self._trials <= 0:
+                    # trial calls came back fine: start afresh
+                    self._state = CLOSED
+                    self._open_for = self.open_seconds
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(True)
+
+    def on_failure(self, error: BaseException) -> None:
+        if not self.is_failure(error):
+            self.on_success()
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._open(now)
+                return
+            if self._state == OPEN:
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._open(now)
+
+    def on_cancel(self) -> None:
+        """
+        Give back a call let through by before_call that ended without an
+        outcome, so a cancelled trial call does not hold its half-open slot.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def call(self, fn: Callable[..., Any], *args, fallback: Optional[Callable[..., Any]] = None, **kwargs) -> Any:
+        """
+        Call fn(*args, **kwargs) through the breaker. If the breaker is
+        open, or fn fails, call fallback(*args, **kwargs) instead when one
+        is given; otherwise raise.
+        """
+        try:
+            self.before_call()
+        except CircuitOpenError:
+            if fallback is None:
+                raise
+            return fallback(*args, **kwargs)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.on_failure(e)
+            if fallback is None:
+                raise
+            return fallback(*args, **kwargs)
+        except BaseException:
+            self.on_cancel()
+            raise
+        self.on_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            outcomes = list(self._outcomes)
+        return {"name": self.name,
+                "state": state,
+                "calls": len(outcomes),
+                "error_rate": outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_after": self.retry_after()}
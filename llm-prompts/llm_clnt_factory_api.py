@@ -1,59 +1,617 @@
-from openai import OpenAI
-from anthropic import Anthropic
-import google.generativeai as genai
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-import ollama
+# The provider SDKs (openai, anthropic, google.generativeai, ollama) are
+# imported lazily by their adapters in llm_providers, the first time a
+# client for that provider is created.
+from llm_providers import StreamChunk, get_provider, provider_for_client, resolve_client_class
+from llm_rate_limiter import estimate_tokens
+from llm_metrics import CallRecord, current_tag, has_observers, notify
+from llm_singleflight import SingleFlight
+from llm_circuit_breaker import CircuitBreaker
+
+# shared by every caller in the process, so identical concurrent
+# requests coalesce no matter which thread or coroutine sends them
+_IN_FLIGHT = SingleFlight()
 
 class ClientFactory:
-    def __init__(self):
+    """
+    Registry of client classes. create_client() builds a new client on
+    every call; get_client() and lease() hand out one shared, thread-safe
+    client per (client_name, kwargs), so its HTTP connection pool and TLS
+    sessions are reused across requests. Shared clients are capped at
+    max_connections, with up to max_keepalive_connections idle connections
+    kept alive for keepalive_expiry seconds.
+    """
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0):
         self.clients = {}
+        self.pool_limits = {"max_connections": max_connections,
+                            "max_keepalive_connections": max_keepalive_connections,
+                            "keepalive_expiry": keepalive_expiry}
+        self._pool = {}
+        self._pool_cond = threading.Condition()
+        self._in_flight = 0
+        self._draining = False
+        self._breakers = {}
+        # names registered without a class, whose SDK class we resolve
+        # and so may give connection limits
+        self._lazy = set()
 
-    def register_client(self, client_name, client_class):
+    def register_client(self, client_name, client_class=None):
+        """
+        Register a client class under client_name. Leave client_class out
+        to use the SDK class of a known provider ('openai', 'anthropic',
+        'ollama', 'google' or their 'async_' variants); its SDK is then only
+        imported when the first client is created.
+        """
         self.clients[client_name] = client_class
+        if client_class is None:
+            self._lazy.add(client_name)
+        else:
+            self._lazy.discard(client_name)
 
     def create_client(self, client_name, **kwargs):
-        client_class = self.clients.get(client_name)
-        if client_class:
-            if client_name == 'google':
-                return client_class(kwargs['model_name'])
-              
-            else:
-                return client_class(**kwargs)
-        else:
+        if client_name not in self.clients:
             raise ValueError(f"Client '{client_name}' not registered.")
+        client_class = self.clients[client_name]
+        if client_class is None:
+            client_class = resolve_client_class(client_name)
+            self.clients[client_name] = client_class
+        if client_name == 'google':
+            return client_class(kwargs['model_name'])
+        else:
+            return client_class(**kwargs)
 
-def _get_chat_response(clnt: object, model: str, system_content: str, user_content:str) -> str:
-    if isinstance(clnt, Anthropic):
-        chat_response = clnt.messages.create(
-                model=model,
-                system = system_content,
-                messages=[{"role": "user", "content": user_content}],
-                max_tokens=2500,
-                temperature = 0.8)
-        response = chat_response.content[0].text
-        return response
-    elif isinstance(clnt, OpenAI):
-        chat_response = clnt.chat.completions.create(
-                model=model,
-                messages=[{"role": "system", "content": system_content},
-                        {"role": "user", "content": user_content}],
-                temperature = 0.8)
-        response = chat_response.choices[0].message.content
-        return response
-    elif isinstance(clnt, ollama.Client):
-        chat_response = clnt.chat(model=model,
-                messages=[{"role": "user", 
-                           "content": user_content}])
-        response = chat_response['message']['content']
-        return response
-    elif isinstance(clnt, genai.GenerativeModel):
-        chat_response = clnt.generate_content(user_content)
-        return chat_response.text
-    else:
-        raise ValueError(f"Client '{clnt}' not registered or not supported.")
-    
-def get_commpletion(clnt: object, model: str, system_content: str, user_content:str) -> str:
-    return _get_chat_response(clnt, model, system_content, user_content)
+    def circuit_breaker(self, clnt: object, **settings) -> CircuitBreaker:
+        """
+        The CircuitBreaker shared by every caller of clnt's endpoint (its
+        provider and base url). settings (failure_rate, open_seconds, ...)
+        apply when the endpoint's breaker is first created.
+        """
+        name = _provider_name(clnt)
+        with self._pool_cond:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **settings)
+            return breaker
+
+    @staticmethod
+    def _pool_key(client_name: str, kwargs: dict) -> Tuple[str, str]:
+        return client_name, json.dumps(kwargs, sort_keys=True, default=repr)
+
+    def _pooled_kwargs(self, client_name: str, kwargs: dict) -> dict:
+        # only known providers get connection limits, and never
+        # when the caller brought their own transport
+        if client_name not in self._lazy or client_name == 'google':
+            return kwargs
+        if "http_client" in kwargs or "limits" in kwargs:
+            return kwargs
+        is_async = client_name.startswith('async_')
+        adapter = get_provider(client_name[len('async_'):] if is_async else client_name)
+        return {**kwargs, **adapter.pooled_client_kwargs(is_async, self.pool_limits)}
+
+    def get_client(self, client_name, **kwargs):
+        """
+        Return the shared client for (client_name, kwargs), creating it
+        on first use.
+        """
+        key = self._pool_key(client_name, kwargs)
+        with self._pool_cond:
+            if self._draining:
+                raise RuntimeError("ClientFactory is draining; no new clients are handed out.")
+            client = self._pool.get(key)
+            if client is None:
+                client = self.create_client(client_name, **self._pooled_kwargs(client_name, kwargs))
+                self._pool[key] = client
+            return client
+
+    @contextmanager
+    def lease(self, client_name, **kwargs):
+        """
+        Borrow the shared client for the duration of a request, so drain()
+        or adrain() can wait for in-flight requests before closing the pool.
+        It works the same inside a coroutine.
+        """
+        # one lock hold, so drain() cannot close the pool between handing
+        # out the client and counting it as in flight
+        with self._pool_cond:
+            client = self.get_client(client_name, **kwargs)
+            self._in_flight += 1
+        try:
+            yield client
+        finally:
+            with self._pool_cond:
+                self._in_flight -= 1
+                self._pool_cond.notify_all()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop handing out shared clients, wait up to timeout seconds for
+        leased requests to finish, then close the pool. Returns False if
+        requests were still in flight when the timeout ran out; the pool
+        then stays open but keeps refusing new clients until drained.
+        Use adrain() when the pool holds async clients.
+        """
+        with self._pool_cond:
+            self._draining = True
+            drained = self._pool_cond.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+        if drained:
+            self.close()
+        return drained
+
+    async def adrain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Coroutine version of drain(): it waits without blocking the event
+        loop, whose own tasks hold the leases, then closes the pool with
+        aclose().
+        """
+        with self._pool_cond:
+            self._draining = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._pool_cond:
+                if self._in_flight == 0:
+                    break
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        await self.aclose()
+        return True
+
+    def _take_pool(self) -> list:
+        with self._pool_cond:
+            clients = list(self._pool.values())
+            self._pool.clear()
+            self._draining = False
+        return clients
+
+    def close(self) -> None:
+        """
+        Close every shared sync client and empty the pool. Use aclose()
+        when the pool holds async clients.
+        """
+        with self._pool_cond:
+            for client in self._pool.values():
+                adapter = provider_for_client(client)
+                if adapter.is_async(client) and adapter.sync_class != adapter.async_class:
+                    raise RuntimeError(f"Use 'await ClientFactory.aclose()' to close async client '{client}'.")
+        for client in self._take_pool():
+            provider_for_client(client).close(client)
+
+    async def aclose(self) -> None:
+        """
+        Close every shared client, sync or async, and empty the pool.
+        """
+        for client in self._take_pool():
+            await provider_for_client(client).aclose(client)
+
+def _get_chat_response(clnt: object, model: str, system_content: str, user_content:str,
+                       temperature: float = 0.8, max_tokens: Optional[int] = None, **options) -> str:
+    adapter = provider_for_client(clnt)
+    return adapter.chat(clnt, model, system_content, user_content,
+                        temperature=temperature, max_tokens=max_tokens, **options)
+
+def _provider_name(clnt: object) -> str:
+    """
+    Name of the provider behind clnt, qualified with the base url for
+    OpenAI-compatible endpoints such as Anyscale or a local server.
+    """
+    name = provider_for_client(clnt).name
+    base_url = getattr(clnt, 'base_url', None)
+    return f"{name}@{base_url}" if base_url else name
+
+async def _achat_with_usage(clnt: object, model: str, system_content: str, user_content:str,
+                            temperature: float = 0.8, max_tokens: Optional[int] = None,
+                            **options) -> Tuple[str, Optional[Dict[str, int]]]:
+    adapter = provider_for_client(clnt)
+    if not adapter.is_async(clnt):
+        # a blocking client was handed in; run it on the default
+        # executor so it does not stall the event loop
+        return await asyncio.to_thread(adapter.chat_with_usage, clnt, model, system_content, user_content,
+                                       temperature, max_tokens, **options)
+    return await adapter.achat_with_usage(clnt, model, system_content, user_content,
+                                          temperature=temperature, max_tokens=max_tokens, **options)
+
+async def _aget_chat_response(clnt: object, model: str, system_content: str, user_content:str,
+                              temperature: float = 0.8, max_tokens: Optional[int] = None, **options) -> str:
+    return (await _achat_with_usage(clnt, model, system_content, user_content,
+                                    temperature=temperature, max_tokens=max_tokens, **options))[0]
+
+def _prompt_text(system_content: str, user_content: str, static_context: Optional[str] = None) -> str:
+    return "\n".join(part for part in (system_content, static_context, user_content) if part)
+
+def _request_tokens(model: str, system_content: str, user_content: str, max_tokens: Optional[int],
+                    static_context: Optional[str] = None) -> int:
+    # providers count max_tokens against the tokens-per-minute budget
+    # up front, so reserve it along with the prompt
+    return estimate_tokens(system_content + (static_context or "") + user_content, model) + (max_tokens or 0)
+
+def _record_call(provider: str, model: str, queued_at: float, sent_at: float,
+                 usage: Optional[Dict[str, int]] = None, first_token_at: Optional[float] = None,
+                 streamed: bool = False, error: Optional[BaseException] = None,
+                 prompt_text: Optional[str] = None, completion_text: Optional[str] = None) -> None:
+    if not has_observers():
+        return
+    finished_at = time.perf_counter()
+    if not streamed:
+        # the first token arrives with the whole response
+        first_token_at = finished_at
+    usage = dict(usage or {})
+    estimated = False
+    if error is None:
+        # some servers and stream modes report no usage; count it ourselves
+        if usage.get("prompt_tokens") is None and prompt_text is not None:
+            usage["prompt_tokens"] = estimate_tokens(prompt_text, model)
+            estimated = True
+        if usage.get("completion_tokens") is None and completion_text is not None:
+            usage["completion_tokens"] = estimate_tokens(completion_text, model)
+            estimated = True
+    notify(CallRecord(provider=provider, model=model,
+                      queue_wait=sent_at - queued_at,
+                      ttft=first_token_at - sent_at if first_token_at is not None else None,
+                      latency=finished_at - sent_at,
+                      prompt_tokens=usage.get("prompt_tokens"),
+                      completion_tokens=usage.get("completion_tokens"),
+                      cache_read_tokens=usage.get("cache_read_tokens"),
+                      cache_write_tokens=usage.get("cache_write_tokens"),
+                      streamed=streamed,
+                      error=type(error).__name__ if error is not None else None,
+                      usage_estimated=estimated,
+                      tag=current_tag()))
+
+@dataclass
+class CompletionResponse:
+    """
+    A completion and its metadata. usage is what the provider reported:
+    prompt_tokens and completion_tokens, plus cache_read_tokens and
+    cache_write_tokens when prompt caching was in play. It is None when
+    the response came from a ResponseCache or SemanticCache (cached=True).
+    """
+    text: str
+    provider: str
+    model: str
+    usage: Optional[Dict[str, int]] = None
+    cached: bool = False
+
+def _flight_key(provider: str, model: str, system_content: str, user_content: str,
+                params: Dict[str, object], cache_prompt: bool) -> tuple:
+    return (provider, model, system_content, user_content, tuple(sorted(params.items())), cache_prompt)
+
+def _cache_params(temperature: float, max_tokens: Optional[int], static_context: Optional[str]) -> Dict[str, object]:
+    params = {"temperature": temperature, "max_tokens": max_tokens}
+    if static_context:
+        params["static_context"] = static_context
+    return params
+
+def get_completion_response(clnt: object, model: str, system_content: str, user_content:str,
+                            temperature: float = 0.8, max_tokens: Optional[int] = None,
+                            static_context: Optional[str] = None,
+                            cache_prompt: bool = False,
+                            cache: Optional[object] = None,
+                            rate_limiter: Optional[object] = None,
+                            coalesce: bool = False,
+                            circuit_breaker: Optional[object] = None) -> CompletionResponse:
+    """
+    get_commpletion, returning a CompletionResponse with the usage stats
+    instead of just the text.
+    """
+    provider = _provider_name(clnt)
+    params = _cache_params(temperature, max_tokens, static_context)
+    if cache is not None:
+        text = cache.get(provider, model, system_content, user_content, params)
+        if text is not None:
+            return CompletionResponse(text, provider, model, cached=True)
+
+    def _send() -> CompletionResponse:
+        if circuit_breaker is not None:
+            # fail fast, before queueing on the rate limiter
+            circuit_breaker.before_call()
+        settled = False
+        try:
+            queued_at = time.perf_counter()
+            if rate_limiter is not None:
+                rate_limiter.acquire(provider, model,
+                                     _request_tokens(model, system_content, user_content, max_tokens,
+                                                     static_context))
+            sent_at = time.perf_counter()
+            try:
+                text, usage = provider_for_client(clnt).chat_with_usage(clnt, model, system_content, user_content,
+                                                                        temperature=temperature, max_tokens=max_tokens,
+                                                                        static_context=static_context,
+                                                                        cache_prompt=cache_prompt)
+            except Exception as e:
+                settled = True
+                if circuit_breaker is not None:
+                    circuit_breaker.on_failure(e)
+                _record_call(provider, model, queued_at, sent_at, error=e)
+                raise
+            settled = True
+            if circuit_breaker is not None:
+                circuit_breaker.on_success()
+        finally:
+            if not settled and circuit_breaker is not None:
+                # interrupted, or refused by the rate limiter: no outcome
+                circuit_breaker.on_cancel()
+        _record_call(provider, model, queued_at, sent_at, usage=usage,
+                     prompt_text=_prompt_text(system_content, user_content, static_context),
+                     completion_text=text)
+        if cache is not None:
+            cache.put(provider, model, system_content, user_content, params, text)
+        return CompletionResponse(text, provider, model, usage=usage)
+
+    if coalesce:
+        return _IN_FLIGHT.do(_flight_key(provider, model, system_content, user_content,
+                                         params, cache_prompt), _send)
+    return _send()
+
+def get_commpletion(clnt: object, model: str, system_content: str, user_content:str,
+                    temperature: float = 0.8, max_tokens: Optional[int] = None,
+                    static_context: Optional[str] = None,
+                    cache_prompt: bool = False,
+                    cache: Optional[object] = None,
+                    rate_limiter: Optional[object] = None,
+                    coalesce: bool = False,
+                    circuit_breaker: Optional[object] = None) -> str:
+    """
+    Get a completion from any registered provider.
+
+    static_context is prompt text that stays the same from call to call,
+    such as retrieved RAG context; it is sent ahead of user_content. With
+    cache_prompt=True the system prompt and static_context are marked as
+    cacheable for Anthropic's prompt caching (OpenAI caches long prefixes
+    on its own). Use get_completion_response to see the cache read and
+    write token counts.
+
+    Pass a ResponseCache (see llm_response_cache.py) as cache to serve
+    repeated prompts from disk, and a RateLimiter (see llm_rate_limiter.py)
+    as rate_limiter to queue requests within the provider's per-minute
+    budgets. With coalesce=True, identical requests already in flight in
+    this process are shared rather than sent again. A CircuitBreaker (see
+    ClientFactory.circuit_breaker) as circuit_breaker makes calls to an
+    unhealthy endpoint fail fast with CircuitOpenError. Calls that reach the
+    provider are reported to the observers registered in llm_metrics.py.
+    """
+    if cache is None and rate_limiter is None and circuit_breaker is None and not coalesce and not has_observers():
+        return _get_chat_response(clnt, model, system_content, user_content,
+                                  temperature=temperature, max_tokens=max_tokens,
+                                  static_context=static_context, cache_prompt=cache_prompt)
+    return get_completion_response(clnt, model, system_content, user_content,
+                                   temperature=temperature, max_tokens=max_tokens,
+                                   static_context=static_context, cache_prompt=cache_prompt,
+                                   cache=cache, rate_limiter=rate_limiter, coalesce=coalesce,
+                                   circuit_breaker=circuit_breaker).text
+
+async def aget_completion_response(clnt: object, model: str, system_content: str, user_content:str,
+                                   temperature: float = 0.8, max_tokens: Optional[int] = None,
+                                   static_context: Optional[str] = None,
+                                   cache_prompt: bool = False,
+                                   cache: Optional[object] = None,
+                                   rate_limiter: Optional[object] = None,
+                                   coalesce: bool = False,
+                                   circuit_breaker: Optional[object] = None) -> CompletionResponse:
+    """
+    Coroutine version of get_completion_response.
+    """
+    provider = _provider_name(clnt)
+    params = _cache_params(temperature, max_tokens, static_context)
+    if cache is not None:
+        text = cache.get(provider, model, system_content, user_content, params)
+        if text is not None:
+            return CompletionResponse(text, provider, model, cached=True)
+
+    async def _send() -> CompletionResponse:
+        if circuit_breaker is not None:
+            circuit_breaker.before_call()
+        settled = False
+        try:
+            queued_at = time.perf_counter()
+            if rate_limiter is not None:
+                await rate_limiter.aacquire(provider, model,
+                                            _request_tokens(model, system_content, user_content, max_tokens,
+                                                            static_context))
+            sent_at = time.perf_counter()
+            try:
+                text, usage = await _achat_with_usage(clnt, model, system_content, user_content,
+                                                      temperature=temperature, max_tokens=max_tokens,
+                                                      static_context=static_context, cache_prompt=cache_prompt)
+            except Exception as e:
+                settled = True
+                if circuit_breaker is not None:
+                    circuit_breaker.on_failure(e)
+                _record_call(provider, model, queued_at, sent_at, error=e)
+                raise
+            settled = True
+            if circuit_breaker is not None:
+                circuit_breaker.on_success()
+        finally:
+            if not settled and circuit_breaker is not None:
+                # cancelled, e.g. by a timeout or a hedged request that
+                # lost, or refused by the rate limiter: no outcome
+                circuit_breaker.on_cancel()
+        _record_call(provider, model, queued_at, sent_at, usage=usage,
+                     prompt_text=_prompt_text(system_content, user_content, static_context),
+                     completion_text=text)
+        if cache is not None:
+            cache.put(provider, model, system_content, user_content, params, text)
+        return CompletionResponse(text, provider, model, usage=usage)
+
+    if coalesce:
+        return await _IN_FLIGHT.ado(_flight_key(provider, model, system_content, user_content,
+                                                params, cache_prompt), _send)
+    return await _send()
+
+async def aget_completion(clnt: object, model: str, system_content: str, user_content:str,
+                         temperature: float = 0.8, max_tokens: Optional[int] = None,
+                         static_context: Optional[str] = None,
+                         cache_prompt: bool = False,
+                         cache: Optional[object] = None,
+                         rate_limiter: Optional[object] = None,
+                         coalesce: bool = False,
+                         circuit_breaker: Optional[object] = None) -> str:
+    """
+    Coroutine version of get_commpletion. Register the async SDK clients
+    (AsyncAnthropic, AsyncOpenAI, ollama.AsyncClient) with the ClientFactory
+    to keep many requests in flight on a single event loop. Gemini's
+    GenerativeModel serves both paths through generate_content_async.
+    """
+    if cache is None and rate_limiter is None and circuit_breaker is None and not coalesce and not has_observers():
+        return await _aget_chat_response(clnt, model, system_content, user_content,
+                                         temperature=temperature, max_tokens=max_tokens,
+                                         static_context=static_context, cache_prompt=cache_prompt)
+    return (await aget_completion_response(clnt, model, system_content, user_content,
+                                           temperature=temperature, max_tokens=max_tokens,
+                                           static_context=static_context, cache_prompt=cache_prompt,
+                                           cache=cache, rate_limiter=rate_limiter, coalesce=coalesce,
+                                           circuit_breaker=circuit_breaker)).text
+
+def _observed_stream(stream: Iterator[StreamChunk], provider: str, model: str,
+                     prompt_text: Optional[str] = None) -> Iterator[StreamChunk]:
+    # the adapter's generator sends the request on the first next()
+    sent_at = time.perf_counter()
+    first_token_at = None
+    parts = []
+    try:
+        for chunk in stream:
+            if first_token_at is None and chunk.text:
+                first_token_at = time.perf_counter()
+            parts.append(chunk.text)
+            if chunk.done:
+                _record_call(provider, model, sent_at, sent_at, usage=chunk.usage,
+                             first_token_at=first_token_at, streamed=True,
+                             prompt_text=prompt_text, completion_text="".join(parts))
+            yield chunk
+    except Exception as e:
+        _record_call(provider, model, sent_at, sent_at, first_token_at=first_token_at,
+                     streamed=True, error=e)
+        raise
+
+async def _aobserved_stream(stream: AsyncIterator[StreamChunk], provider: str, model: str,
+                            prompt_text: Optional[str] = None) -> AsyncIterator[StreamChunk]:
+    sent_at = time.perf_counter()
+    first_token_at = None
+    parts = []
+    try:
+        async for chunk in stream:
+            if first_token_at is None and chunk.text:
+                first_token_at = time.perf_counter()
+            parts.append(chunk.text)
+            if chunk.done:
+                _record_call(provider, model, sent_at, sent_at, usage=chunk.usage,
+                             first_token_at=first_token_at, streamed=True,
+                             prompt_text=prompt_text, completion_text="".join(parts))
+            yield chunk
+    except Exception as e:
+        _record_call(provider, model, sent_at, sent_at, first_token_at=first_token_at,
+                     streamed=True, error=e)
+        raise
+
+def stream_completion(clnt: object, model: str, system_content: str, user_content:str,
+                      temperature: float = 0.8, max_tokens: Optional[int] = None,
+                      static_context: Optional[str] = None,
+                      cache_prompt: bool = False) -> Iterator[StreamChunk]:
+    """
+    Stream a completion as StreamChunk text deltas, whichever of the
+    four providers clnt belongs to. The final chunk has done=True and
+    carries the usage stats. static_context and cache_prompt work as in
+    get_commpletion.
+    """
+    adapter = provider_for_client(clnt)
+    stream = adapter.stream(clnt, model, system_content, user_content,
+                            temperature=temperature, max_tokens=max_tokens,
+                            static_context=static_context, cache_prompt=cache_prompt)
+    if not has_observers():
+        return stream
+    return _observed_stream(stream, _provider_name(clnt), model,
+                            prompt_text=_prompt_text(system_content, user_content, static_context))
+
+async def astream_completion(clnt: object, model: str, system_content: str, user_content:str,
+                             temperature: float = 0.8, max_tokens: Optional[int] = None,
+                             static_context: Optional[str] = None,
+                             cache_prompt: bool = False) -> AsyncIterator[StreamChunk]:
+    """
+    Async generator version of stream_completion for the async SDK clients.
+    """
+    adapter = provider_for_client(clnt)
+    if not adapter.is_async(clnt):
+        raise ValueError(f"Client '{clnt}' is not an async client.")
+    stream = adapter.astream(clnt, model, system_content, user_content,
+                             temperature=temperature, max_tokens=max_tokens,
+                             static_context=static_context, cache_prompt=cache_prompt)
+    if has_observers():
+        stream = _aobserved_stream(stream, _provider_name(clnt), model,
+                                   prompt_text=_prompt_text(system_content, user_content, static_context))
+    async for chunk in stream:
+        yield chunk
+
+@dataclass
+class CompletionResult:
+    """
+    Outcome of one prompt in a batch: either the response text
+    or the exception raised while producing it.
+    """
+    index: int
+    user_content: str
+    response: Optional[str] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def get_completions(clnt: object, model: str, system_content: str, user_contents: List[str],
+                    max_concurrency: int = 8, **kwargs) -> List[CompletionResult]:
+    """
+    Fan a list of prompts out over a pool of at most max_concurrency workers.
+    Results come back in input order; a failed prompt is reported on its own
+    CompletionResult and does not abort the rest of the batch. Other keyword
+    arguments (temperature, cache, rate_limiter, coalesce, ...) are passed
+    on to get_commpletion.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    def _complete(index: int, user_content: str) -> CompletionResult:
+        try:
+            response = get_commpletion(clnt, model, system_content, user_content, **kwargs)
+            return CompletionResult(index, user_content, response=response)
+        except Exception as e:
+            return CompletionResult(index, user_content, error=e)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        # run each prompt in a copy of the caller's context, so the
+        # worker threads see its tag_calls() tag
+        futures = [executor.submit(contextvars.copy_context().run, _complete, index, user_content)
+                   for index, user_content in enumerate(user_contents)]
+        return [future.result() for future in futures]
+
+async def aget_completions(clnt: object, model: str, system_content: str, user_contents: List[str],
+                           max_concurrency: int = 64, **kwargs) -> List[CompletionResult]:
+    """
+    Coroutine version of get_completions; a semaphore caps the number of
+    requests in flight on the event loop. Other keyword arguments are
+    passed on to aget_completion.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _complete(index: int, user_content: str) -> CompletionResult:
+        async with semaphore:
+            try:
+                response = await aget_completion(clnt, model, system_content, user_content, **kwargs)
+                return CompletionResult(index, user_content, response=response)
+            except Exception as e:
+                return CompletionResult(index, user_content, error=e)
+
+    return list(await asyncio.gather(*(_complete(i, c) for i, c in enumerate(user_contents))))
 
     
 
@@ -62,7 +620,7 @@ if __name__ == "__main__":
 
     # Test OpenAI client
     client_factory = ClientFactory()
-    client_factory.register_client('openai', OpenAI)
+    client_factory.register_client('openai')
     client_type = 'openai'
     client_kwargs = {"api_key": 
                         "sk-1234567890abcdef1234567890abcdef",
@@ -74,7 +632,7 @@ if __name__ == "__main__":
     print("--------------------------")
 
     # Test Anthropic client
-    client_factory.register_client('anthropic', Anthropic)
+    client_factory.register_client('anthropic')
     client_type = 'anthropic'
     client_kwargs = {"api_key": 
                         "sk-1234567890abcdef1234567890abcdef",}
@@ -84,7 +642,7 @@ if __name__ == "__main__":
     print("--------------------------")
 
     # Test Ollama client
-    client_factory.register_client('ollama', ollama.Client)
+    client_factory.register_client('ollama')
     client_type = 'ollama'
     client_kwargs = {}
     client = client_factory.create_client(client_type, **client_kwargs) 
@@ -92,7 +650,7 @@ if __name__ == "__main__":
     print("--------------------------")
 
     # Test Google Generative AI client
-    client_factory.register_client('google', genai.GenerativeModel)
+    client_factory.register_client('google')
     client_type = 'google'
     client_kwargs = {"model_name": "gemini-1.5-flash",
                      "generation_config": {"temperature": 0.8,
@@ -103,5 +661,15 @@ if __name__ == "__main__":
     client = client_factory.create_client(client_type, **client_kwargs)
     print(client)
     print("--------------------------")
-    
 
+    # Test async clients
+    client_factory.register_client('async_openai')
+    client = client_factory.create_client('async_openai', api_key="sk-1234567890abcdef1234567890abcdef")
+    print(client)
+    client_factory.register_client('async_anthropic')
+    client = client_factory.create_client('async_anthropic', api_key="sk-1234567890abcdef1234567890abcdef")
+    print(client)
+    client_factory.register_client('async_ollama')
+    client = client_factory.create_client('async_ollama')
+    print(client)
+    print("--------------------------")
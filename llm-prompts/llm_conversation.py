@@ -0,0 +1,220 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from llm_clnt_factory_api import (aget_completion, aget_completion_response,
+                                  get_commpletion, get_completion_response)
+from llm_rate_limiter import estimate_tokens
+
+#
+# Multi-turn conversation state for the client factory, kept within a
+# prompt-token budget. Recent turns are sent verbatim; when the prompt
+# would grow past the budget, the oldest exchanges are folded into a
+# running summary by the LLM. Prompt size, and with it prefill latency,
+# then levels off instead of climbing turn by turn until a long session
+# hits the model's context limit.
+#
+
+SUMMARY_SYSTEM_CONTENT = """You maintain a running summary of a conversation between a user and an assistant.
+                            Merge the new exchanges into the current summary. Keep names, facts, numbers,
+                            decisions, open questions and anything the user asked to remember. Be concise
+                            and write in the third person. Reply with the updated summary only.
+                         """
+
+@dataclass
+class Message:
+    role: str
+    content: str
+    tokens: int
+
+@dataclass
+class TurnStats:
+    """
+    prompt_tokens is our tiktoken estimate of the prompt sent for the turn;
+    reported_prompt_tokens is the provider's count, when it reports usage.
+    folded_messages is how many older messages were summarized before it.
+    """
+    turn: int
+    prompt_tokens: int
+    reported_prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    folded_messages: int = 0
+
+# keyword arguments a Conversation passes on to every call it makes
+COMPLETION_KWARGS = {"cache_prompt", "cache", "rate_limiter", "coalesce", "circuit_breaker"}
+
+class Conversation:
+    """
+    A conversation with one model through the client factory.
+
+        chat = Conversation(client, model, "You are a helpful support agent.", max_prompt_tokens=3000)
+        print(chat.send("My order 1234 has not arrived."))
+        print(chat.send("What was my order number?"))
+        print(chat.turn_stats[-1].prompt_tokens)
+
+    The adapters send one system and one user message, so the summary and
+    the recent turns go in as a transcript in static_context, ahead of the
+    new message. When the estimated prompt would exceed max_prompt_tokens,
+    the oldest exchanges are summarized until it is back under three
+    quarters of the budget, so the summarizer runs every few turns rather
+    than on every turn. The most recent min_recent_turns exchanges are
+    always kept verbatim. The summary is written by summarizer_client and
+    summarizer_model (by default the conversation's own), capped at
+    summary_max_tokens. The budget covers the prompt only; leave room for
+    max_tokens of answer within the model's context window.
+
+    Extra keyword arguments, one of COMPLETION_KWARGS, are passed on to
+    get_completion_response or aget_completion_response, for the summarizer
+    calls as well, so a rate limiter or circuit breaker covers both.
+    """
+    def __init__(self, clnt: object, model: str, system_content: str,
+                 max_prompt_tokens: int = 3000, min_recent_turns: int = 2,
+                 summary_max_tokens: int = 400, summarizer_client: Optional[object] = None,
+                 summarizer_model: Optional[str] = None, temperature: float = 0.8,
+                 max_tokens: Optional[int] = None, **completion_kwargs):
+        unknown = set(completion_kwargs) - COMPLETION_KWARGS
+        if unknown:
+            raise TypeError(f"Unexpected keyword arguments: {', '.join(sorted(unknown))}")
+        self.clnt = clnt
+        self.model = model
+        self.system_content = system_content
+        self.max_prompt_tokens = max_prompt_tokens
+        self.min_recent_turns = min_recent_turns
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer_client = summarizer_client or clnt
+        self.summarizer_model = summarizer_model or model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.completion_kwargs = completion_kwargs
+        self.messages: List[Message] = []
+        self.summary = ""
+        self._summary_tokens = 0
+        self._system_tokens = self._count(system_content)
+        self.turn_stats: List[TurnStats] = []
+
+    def _count(self, text: str) -> int:
+        return estimate_tokens(text, self.model)
+
+    def prompt_tokens(self, user_content: str = "") -> int:
+        """
+        Estimated prompt tokens for sending user_content next, from the
+        token counts kept for each message rather than re-encoding them.
+        """
+        # a few tokens per message for the "User:"/"Assistant:" labels
+        history = sum(m.tokens + 4 for m in self.messages)
+        return self._system_tokens + self._summary_tokens + history + self._count(user_content)
+
+    def _messages_to_fold(self, new_tokens: int) -> int:
+        history = [m.tokens + 4 for m in self.messages]
+        total = self._system_tokens + self._summary_tokens + sum(history) + new_tokens
+        if total <= self.max_prompt_tokens:
+            return 0
+        # the summary grows to at most summary_max_tokens once folded
+        target = int(self.max_prompt_tokens * 0.75) - self.summary_max_tokens + self._summary_tokens
+        keep = 2 * self.min_recent_turns
+        n = 0
+        # fold whole user/assistant exchanges, oldest first
+        while len(self.messages) - n > keep and total > target:
+            total -= sum(history[n:n + 2])
+            n += 2
+        return n
+
+    def _summary_prompt(self, n: int) -> str:
+        transcript = self._transcript(self.messages[:n])
+        return (f"Current summary:\n{self.summary or '(none)'}\n\n"
+                f"New exchanges to merge in:\n{transcript}")
+
+    def _set_summary(self, n: int, summary: str) -> None:
+        self.summary = summary.strip()
+        self._summary_tokens = self._count(self.summary)
+        del self.messages[:n]
+
+    @staticmethod
+    def _transcript(messages: List[Message]) -> str:
+        return "\n\n".join(f"{m.role.capitalize()}: {m.content}" for m in messages)
+
+    def static_context(self) -> Optional[str]:
+        """
+        The summary and recent turns as they are sent with the next message.
+        """
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if self.messages:
+            parts.append(f"Recent conversation:\n{self._transcript(self.messages)}")
+        if not parts:
+            return None
+        return "\n\n".join(parts) + "\n\nContinue the conversation. The user's new message follows."
+
+    def _record(self, user_content: str, new_tokens: int, response, prompt_tokens: int, folded: int) -> str:
+        self.messages.append(Message("user", user_content, new_tokens))
+        self.messages.append(Message("assistant", response.text, self._count(response.text)))
+        usage = response.usage or {}
+        self.turn_stats.append(TurnStats(turn=len(self.turn_stats) + 1,
+                                         prompt_tokens=prompt_tokens,
+                                         reported_prompt_tokens=usage.get("prompt_tokens"),
+                                         completion_tokens=usage.get("completion_tokens"),
+                                         folded_messages=folded))
+        return response.text
+
+    def send(self, user_content: str) -> str:
+        """
+        Send the next user message and return the reply.
+        """
+        new_tokens = self._count(user_content)
+        folded = self._messages_to_fold(new_tokens)
+        if folded:
+            self._set_summary(folded, get_commpletion(self.summarizer_client, self.summarizer_model,
+                                                      SUMMARY_SYSTEM_CONTENT, self._summary_prompt(folded),
+                                                      temperature=0.0, max_tokens=self.summary_max_tokens,
+                                                      **self.completion_kwargs))
+        prompt_tokens = self.prompt_tokens(user_content)
+        response = get_completion_response(self.clnt, self.model, self.system_content, user_content,
+                                           temperature=self.temperature, max_tokens=self.max_tokens,
+                                           static_context=self.static_context(), **self.completion_kwargs)
+        return self._record(user_content, new_tokens, response, prompt_tokens, folded)
+
+    async def asend(self, user_content: str) -> str:
+        """
+        Coroutine version of send, for the async SDK clients.
+        """
+        new_tokens = self._count(user_content)
+        folded = self._messages_to_fold(new_tokens)
+        if folded:
+            self._set_summary(folded, await aget_completion(self.summarizer_client, self.summarizer_model,
+                                                            SUMMARY_SYSTEM_CONTENT, self._summary_prompt(folded),
+                                                            temperature=0.0, max_tokens=self.summary_max_tokens,
+                                                            **self.completion_kwargs))
+        prompt_tokens = self.prompt_tokens(user_content)
+        response = await aget_completion_response(self.clnt, self.model, self.system_content, user_content,
+                                                  temperature=self.temperature, max_tokens=self.max_tokens,
+                                                  static_context=self.static_context(), **self.completion_kwargs)
+        return self._record(user_content, new_tokens, response, prompt_tokens, folded)
+
+    def reset(self) -> None:
+        self.messages.clear()
+        self.summary = ""
+        self._summary_tokens = 0
+        self.turn_stats.clear()
+
+if __name__ == "__main__":
+    import os
+    from dotenv import load_dotenv, find_dotenv
+    from llm_clnt_factory_api import ClientFactory
+
+    _ = load_dotenv(find_dotenv())
+    MODEL = os.getenv("MODEL", "mistral")
+
+    # chat with a local Ollama model; type 'quit' to stop
+    client_factory = ClientFactory()
+    client_factory.register_client('ollama')
+    client = client_factory.create_client('ollama')
+    chat = Conversation(client, MODEL, "You are a friendly and helpful assistant.",
+                        max_prompt_tokens=2000)
+    while True:
+        user_content = input("You: ")
+        if user_content.strip().lower() in ("quit", "exit"):
+            break
+        print(f"Assistant: {chat.send(user_content)}")
+        stats = chat.turn_stats[-1]
+        print(f"[turn {stats.turn}: ~{stats.prompt_tokens} prompt tokens, "
+              f"{stats.folded_messages} messages summarized]")
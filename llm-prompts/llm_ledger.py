@@ -0,0 +1,307 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from llm_metrics import CallObserver, CallRecord, tag_calls
+from llm_rate_limiter import estimate_tokens
+
+#
+# Token and cost ledger. Every call is recorded in a local SQLite file with
+# its prompt and completion tokens, provider, model and caller tag, and
+# priced from a configurable table. Calls are grouped into runs, one per
+# ledger instance, so the rollups answer "which pipeline burned the budget
+# in last night's run". Calls through the client factory are picked up as
+# an observer; DSPy programs, which call their LMs directly, are read back
+# from the LM's history.
+#
+#   ledger = add_observer(TokenLedger(run_name="nightly-eval"))
+#   with tag_calls("rag_search"):
+#       ... get_commpletion(...) ...
+#   with ledger.dspy_calls(dspy.settings.lm, "SimplifiedPipeline"):
+#       pred = pipeline(question)
+#   ledger.print_rollup()
+#
+# python llm-prompts/llm_ledger.py --runs        # list the recorded runs
+# python llm-prompts/llm_ledger.py [--run RUN]   # rollup of the last (or given) run
+#
+
+DEFAULT_LEDGER_PATH = os.path.join(os.path.expanduser("~"), ".cache", "genai-cookbook", "llm_ledger.sqlite")
+
+# USD per million tokens, keyed by model name prefix; the longest matching
+# prefix wins. cache_read and cache_write default to the input price.
+# These are list prices at the time of writing: check the providers'
+# pricing pages, and pass your own table or a JSON file to PriceTable.
+DEFAULT_MODEL_PRICES = {
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60, "cache_read": 0.075},
+    "gpt-4o": {"input": 2.50, "output": 10.00, "cache_read": 1.25},
+    "gpt-4-turbo": {"input": 10.00, "output": 30.00},
+    # the GPT-4 Turbo previews, which do not carry "turbo" in the name
+    "gpt-4-1106": {"input": 10.00, "output": 30.00},
+    "gpt-4-0125": {"input": 10.00, "output": 30.00},
+    "gpt-4-vision-preview": {"input": 10.00, "output": 30.00},
+    "gpt-4": {"input": 30.00, "output": 60.00},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
+    "claude-3-5-sonnet": {"input": 3.00, "output": 15.00, "cache_read": 0.30, "cache_write": 3.75},
+    "claude-3-opus": {"input": 15.00, "output": 75.00, "cache_read": 1.50, "cache_write": 18.75},
+    "claude-3-sonnet": {"input": 3.00, "output": 15.00},
+    "claude-3-haiku": {"input": 0.25, "output": 1.25, "cache_read": 0.03, "cache_write": 0.30},
+    "gemini-1.5-flash": {"input": 0.075, "output": 0.30},
+    "gemini-1.5-pro": {"input": 1.25, "output": 5.00},
+}
+
+# local models cost nothing per token
+DEFAULT_PROVIDER_PRICES = {
+    "ollama": {"input": 0.0, "output": 0.0},
+}
+
+class PriceTable:
+    """
+    Prices per million tokens by model name prefix, with per-provider
+    defaults for models that match no prefix. A JSON file holds
+    {"models": {...}, "providers": {...}} in the same format as
+    DEFAULT_MODEL_PRICES and DEFAULT_PROVIDER_PRICES.
+    """
+    def __init__(self, models: Optional[Dict[str, Dict[str, float]]] = None,
+                 providers: Optional[Dict[str, Dict[str, float]]] = None):
+        self.models = DEFAULT_MODEL_PRICES if models is None else models
+        self.providers = DEFAULT_PROVIDER_PRICES if providers is None else providers
+
+    @classmethod
+    def from_json(cls, path: str) -> "PriceTable":
+        with open(path) as f:
+            table = json.load(f)
+        return cls(table.get("models", {}), table.get("providers", {}))
+
+    def prices_for(self, provider: str, model: str) -> Optional[Dict[str, float]]:
+        # the factory names OpenAI-compatible endpoints "openai@<base_url>"
+        provider = provider.split("@")[0]
+        # hosted models are often named "vendor/model"
+        name = (model or "").split("/")[-1]
+        matches = [prefix for prefix in self.models if name.startswith(prefix)]
+        if matches:
+            return self.models[max(matches, key=len)]
+        return self.providers.get(provider)
+
+    def cost(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+             cache_read_tokens: int = 0, cache_write_tokens: int = 0) -> Optional[float]:
+        """
+        Cost in USD, or None when the model has no price. prompt_tokens
+        includes the cached tokens, which are billed at their own rates.
+        """
+        prices = self.prices_for(provider, model)
+        if prices is None:
+            return None
+        uncached = max(prompt_tokens - cache_read_tokens - cache_write_tokens, 0)
+        return (uncached * prices["input"]
+                + cache_read_tokens * prices.get("cache_read", prices["input"])
+                + cache_write_tokens * prices.get("cache_write", prices["input"])
+                + completion_tokens * prices["output"]) / 1e6
+
+class TokenLedger(CallObserver):
+    """
+    Records calls in a local SQLite file, as one run per instance. Register
+    it with add_observer to record calls made through the client factory,
+    and use dspy_calls() around DSPy programs. Rows are written in batches
+    of flush_every; rollup(), flush() and close() write out the rest.
+    """
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH, run_name: Optional[str] = None,
+                 prices: Optional[PriceTable] = None, flush_every: int = 50):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.prices = prices or PriceTable()
+        self.flush_every = flush_every
+        self.run_id = uuid.uuid4().hex[:12]
+        self.run_name = run_name
+        self._pending = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                name TEXT,
+                started_at REAL NOT NULL,
+                finished_at REAL);
+            CREATE TABLE IF NOT EXISTS calls (
+                run_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                tag TEXT,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                cache_read_tokens INTEGER NOT NULL,
+                cache_write_tokens INTEGER NOT NULL,
+                estimated INTEGER NOT NULL,
+                cost REAL,
+                error TEXT);
+            CREATE INDEX IF NOT EXISTS calls_run_id ON calls (run_id);
+            -- recreated each time, so ledgers written by older versions
+            -- pick up new columns
+            BEGIN;
+            DROP VIEW IF EXISTS run_rollups;
+            CREATE VIEW run_rollups AS
+                SELECT run_id, tag, provider, model,
+                       COUNT(*) AS calls,
+                       SUM(error IS NOT NULL) AS errors,
+                       SUM(estimated) AS estimated_calls,
+                       SUM(prompt_tokens) AS prompt_tokens,
+                       SUM(completion_tokens) AS completion_tokens,
+                       SUM(cache_read_tokens) AS cache_read_tokens,
+                       SUM(cache_write_tokens) AS cache_write_tokens,
+                       SUM(cost) AS cost,
+                       SUM(cost IS NULL AND error IS NULL) AS unpriced_calls
+                FROM calls GROUP BY run_id, tag, provider, model;
+            COMMIT;
+        """)
+        self._conn.execute("INSERT INTO runs (run_id, name, started_at) VALUES (?, ?, ?)",
+                           (self.run_id, run_name, time.time()))
+        self._conn.commit()
+
+    def record(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+               tag: Optional[str] = None, cache_read_tokens: int = 0, cache_write_tokens: int = 0,
+               estimated: bool = False, error: Optional[str] = None) -> None:
+        cost = self.prices.cost(provider, model, prompt_tokens, completion_tokens,
+                                cache_read_tokens, cache_write_tokens)
+        row = (self.run_id, time.time(), tag, provider, model or "", prompt_tokens, completion_tokens,
+               cache_read_tokens, cache_write_tokens, int(estimated), cost, error)
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+
+    def on_call(self, record: CallRecord) -> None:
+        self.record(record.provider, record.model,
+                    record.prompt_tokens or 0, record.completion_tokens or 0,
+                    tag=record.tag,
+                    cache_read_tokens=record.cache_read_tokens or 0,
+                    cache_write_tokens=record.cache_write_tokens or 0,
+                    estimated=record.usage_estimated, error=record.error)
+
+    @contextmanager
+    def dspy_calls(self, lm: object, tag: str) -> Iterator[None]:
+        """
+        Record the calls a DSPy LM makes inside the block under tag. They
+        are read from lm.history when the block exits, using the usage the
+        provider returned, or tiktoken estimates when there is none (e.g.
+        from Ollama).
+        """
+        start = len(lm.history)
+        try:
+            with tag_calls(tag):
+                yield
+        finally:
+            for entry in lm.history[start:]:
+                self._record_dspy(lm, entry, tag)
+
+    def _record_dspy(self, lm: object, entry: Dict[str, Any], tag: str) -> None:
+        kwargs = entry.get("kwargs") or {}
+        model = kwargs.get("model") or getattr(lm, "kwargs", {}).get("model") or getattr(lm, "model_name", "")
+        provider = getattr(lm, "provider", None) or type(lm).__name__.lower()
+        response = entry.get("response")
+        usage = (response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)) or {}
+        if not isinstance(usage, dict):
+            usage = {k: getattr(usage, k, None) for k in ("prompt_tokens", "completion_tokens",
+                                                         "input_tokens", "output_tokens")}
+        prompt_tokens = usage.get("prompt_tokens") or usage.get("input_tokens")
+        completion_tokens = usage.get("completion_tokens") or usage.get("output_tokens")
+        estimated = False
+        if prompt_tokens is None:
+            prompt = entry.get("prompt") or json.dumps(entry.get("messages") or "")
+            prompt_tokens = estimate_tokens(prompt, model)
+            estimated = True
+        if completion_tokens is None:
+            completion_tokens = sum(estimate_tokens(text, model) for text in _dspy_completions(response))
+            estimated = True
+        self.record(provider, model, prompt_tokens, completion_tokens, tag=tag, estimated=estimated)
+
+    def _flush_locked(self) -> None:
+        if self._pending:
+            self._conn.executemany("INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self._conn.commit()
+            self._pending = []
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def rollup(self, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Totals per tag, provider and model for a run, this one by default,
+        most expensive first.
+        """
+        self.flush()
+        return _rollup(self._conn, run_id or self.run_id, self._lock)
+
+    def print_rollup(self, run_id: Optional[str] = None) -> None:
+        print_rollup(self.rollup(run_id))
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+            self._conn.commit()
+            self._conn.close()
+
+def _dspy_completions(response: Any) -> List[str]:
+    # the raw provider response DSPy keeps: choices with "text" or a
+    # chat "message", or Ollama's "response"
+    if isinstance(response, dict):
+        if "response" in response:
+            return [response["response"] or ""]
+        texts = []
+        for choice in response.get("choices", []):
+            message = choice.get("message") or {}
+            texts.append(choice.get("text") or message.get("content") or "")
+        return texts
+    return [str(response or "")]
+
+def _rollup(conn: sqlite3.Connection, run_id: str, lock: Optional[threading.Lock] = None) -> List[Dict[str, Any]]:
+    query = "SELECT * FROM run_rollups WHERE run_id = ? ORDER BY cost DESC, prompt_tokens DESC"
+    with lock or threading.Lock():
+        cursor = conn.execute(query, (run_id,))
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def print_rollup(rows: List[Dict[str, Any]]) -> None:
+    header = (f"{'tag':<24} {'provider':<16} {'model':<28} {'calls':>6} {'errors':>6} "
+              f"{'prompt':>10} {'completion':>10} {'cost $':>10}")
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        cost = "n/a" if row["cost"] is None else f"{row['cost']:.4f}"
+        print(f"{(row['tag'] or '-')[:24]:<24} {row['provider'][:16]:<16} {row['model'][-28:]:<28} "
+              f"{row['calls']:>6} {row['errors']:>6} {row['prompt_tokens']:>10} "
+              f"{row['completion_tokens']:>10} {cost:>10}")
+    total = sum(row["cost"] or 0 for row in rows)
+    estimated = sum(row["estimated_calls"] for row in rows)
+    print(f"Total: ${total:.4f}" + (f" ({estimated} calls with estimated tokens)" if estimated else ""))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show token and cost rollups from the LLM ledger")
+    parser.add_argument("--path", default=DEFAULT_LEDGER_PATH)
+    parser.add_argument("--run", default=None, help="run id; the most recent run by default")
+    parser.add_argument("--runs", action="store_true", help="list the recorded runs")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.path)
+    if args.runs:
+        for run_id, name, started_at, calls, cost in conn.execute(
+                """SELECT r.run_id, r.name, r.started_at, COUNT(c.run_id), SUM(c.cost)
+                   FROM runs r LEFT JOIN calls c ON c.run_id = r.run_id
+                   GROUP BY r.run_id ORDER BY r.started_at DESC"""):
+            started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at))
+            print(f"{run_id}  {started}  {name or '-':<24} calls={calls} cost=${cost or 0:.4f}")
+    else:
+        run_id = args.run or conn.execute("""SELECT run_id FROM runs WHERE run_id IN (SELECT run_id FROM calls)
+                                             ORDER BY started_at DESC LIMIT 1""").fetchone()[0]
+        print(f"Run {run_id}")
+        print_rollup(_rollup(conn, run_id))
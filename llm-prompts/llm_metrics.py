@@ -0,0 +1,234 @@
+import contextvars
+import json
+import math
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+#
+# Per-call instrumentation for the client factory. Every completion made
+# through get_commpletion, aget_completion or the streaming helpers produces
+# a CallRecord, handed to each registered observer. MetricsObserver
+# aggregates them into in-memory histograms that can be dumped as JSON or
+# in the Prometheus text exposition format.
+#
+
+@dataclass
+class CallRecord:
+    """
+    Timings are in seconds. queue_wait is time spent waiting on a rate
+    limiter before the request went out. For non-streamed calls the first
+    token arrives with the whole response, so ttft equals latency.
+    Token counts are None when the provider did not report usage;
+    cache_read_tokens and cache_write_tokens are the part of the prompt
+    served from or written to the provider's prompt cache. When the
+    provider reported no usage, token counts are tiktoken estimates and
+    usage_estimated is True. tag is the caller tag set with tag_calls().
+    """
+    provider: str
+    model: str
+    queue_wait: float
+    ttft: Optional[float]
+    latency: float
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cache_read_tokens: Optional[int] = None
+    cache_write_tokens: Optional[int] = None
+    streamed: bool = False
+    error: Optional[str] = None
+    usage_estimated: bool = False
+    tag: Optional[str] = None
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if not self.completion_tokens or self.latency <= 0:
+            return None
+        return self.completion_tokens / self.latency
+
+class CallObserver:
+    """
+    Base class for observers; override on_call. Observers are called on
+    the thread (or event loop) that made the request, so keep them cheap.
+    """
+    def on_call(self, record: CallRecord) -> None:
+        pass
+
+_OBSERVERS: List[CallObserver] = []
+
+_CALLER_TAG = contextvars.ContextVar("llm_caller_tag", default=None)
+
+@contextmanager
+def tag_calls(tag: str) -> Iterator[None]:
+    """
+    Attribute the calls made inside the block, and in tasks started from
+    it, to tag, e.g. the name of the pipeline making them.
+
+        with tag_calls("rag_search"):
+            get_commpletion(client, model, system_content, user_content)
+    """
+    token = _CALLER_TAG.set(tag)
+    try:
+        yield
+    finally:
+        _CALLER_TAG.reset(token)
+
+def current_tag() -> Optional[str]:
+    return _CALLER_TAG.get()
+
+def add_observer(observer: CallObserver) -> CallObserver:
+    _OBSERVERS.append(observer)
+    return observer
+
+def remove_observer(observer: CallObserver) -> None:
+    _OBSERVERS.remove(observer)
+
+def has_observers() -> bool:
+    return bool(_OBSERVERS)
+
+def notify(record: CallRecord) -> None:
+    for observer in list(_OBSERVERS):
+        observer.on_call(record)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKENS_PER_SEC_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, as in Prometheus, with quantiles
+    interpolated within the bucket they fall in.
+    """
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.buckets, self.counts):
+            if seen + n >= target and n:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (target - seen) / n
+            seen += n
+            lower = bound
+        return lower
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.50),
+                "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99)}
+
+_HISTOGRAMS = {"queue_wait_seconds": LATENCY_BUCKETS,
+               "ttft_seconds": LATENCY_BUCKETS,
+               "latency_seconds": LATENCY_BUCKETS,
+               "tokens_per_second": TOKENS_PER_SEC_BUCKETS}
+
+_COUNTERS = ("calls", "errors", "prompt_tokens", "completion_tokens",
+             "cache_read_tokens", "cache_write_tokens")
+
+class MetricsObserver(CallObserver):
+    """
+    Aggregates CallRecords per (provider, model).
+
+        metrics = add_observer(MetricsObserver())
+        ... make calls ...
+        print(metrics.to_json())
+        open("llm.prom", "w").write(metrics.to_prometheus())
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], Dict[str, object]] = {}
+
+    def _series_for(self, provider: str, model: str) -> Dict[str, object]:
+        series = self._series.get((provider, model))
+        if series is None:
+            series = {name: Histogram(buckets) for name, buckets in _HISTOGRAMS.items()}
+            series.update({name: 0 for name in _COUNTERS})
+            self._series[(provider, model)] = series
+        return series
+
+    def on_call(self, record: CallRecord) -> None:
+        with self._lock:
+            series = self._series_for(record.provider, record.model)
+            series["calls"] += 1
+            if record.error is not None:
+                series["errors"] += 1
+                return
+            series["queue_wait_seconds"].observe(record.queue_wait)
+            series["latency_seconds"].observe(record.latency)
+            if record.ttft is not None:
+                series["ttft_seconds"].observe(record.ttft)
+            if record.tokens_per_sec is not None:
+                series["tokens_per_second"].observe(record.tokens_per_sec)
+            series["prompt_tokens"] += record.prompt_tokens or 0
+            series["completion_tokens"] += record.completion_tokens or 0
+            series["cache_read_tokens"] += record.cache_read_tokens or 0
+            series["cache_write_tokens"] += record.cache_write_tokens or 0
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        with self._lock:
+            return [{"provider": provider, "model": model,
+                     **{name: (value.to_dict() if isinstance(value, Histogram) else value)
+                        for name, value in series.items()}}
+                    for (provider, model), series in self._series.items()]
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix: str = "llm") -> str:
+        def labels(provider, model, **extra):
+            pairs = {"provider": provider, "model": model, **extra}
+            return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+        lines = []
+        with self._lock:
+            series_items = list(self._series.items())
+            for name in _COUNTERS:
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (provider, model), series in series_items:
+                    lines.append(f"{metric}{{{labels(provider, model)}}} {series[name]}")
+            for name in _HISTOGRAMS:
+                metric = f"{prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for (provider, model), series in series_items:
+                    histogram = series[name]
+                    cumulative = 0
+                    for bound, n in zip(histogram.buckets, histogram.counts):
+                        cumulative += n
+                        le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                        lines.append(f"{metric}_bucket{{{labels(provider, model, le=le)}}} {cumulative}")
+                    lines.append(f"{metric}_sum{{{labels(provider, model)}}} {histogram.sum}")
+                    lines.append(f"{metric}_count{{{labels(provider, model)}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class LoggingObserver(CallObserver):
+    """
+    Print one JSON line per call; handy when running the example scripts.
+    """
+    def on_call(self, record: CallRecord) -> None:
+        print(json.dumps({**asdict(record), "tokens_per_sec": record.tokens_per_sec}))
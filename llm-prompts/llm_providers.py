@@ -0,0 +1,407 @@
+import importlib
+import sys
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+
+#
+# Provider adapters for the client factory. Each adapter knows how to talk to
+# one SDK, but only imports it when a client for that provider is first
+# created, so a script that only uses Ollama never pays for importing
+# google.generativeai, anthropic or openai.
+#
+
+# Anthropic requires max_tokens on every request; the other providers get a
+# limit only when the caller passes one, and otherwise use their own
+ANTHROPIC_MAX_TOKENS = 2500
+
+@dataclass
+class StreamChunk:
+    """
+    Provider-neutral streaming event. Every chunk but the last carries a
+    text delta; the last one has done=True and the final usage stats as
+    {"prompt_tokens": int, "completion_tokens": int} when the provider
+    reports them.
+    """
+    text: str = ""
+    done: bool = False
+    usage: Optional[Dict[str, int]] = None
+
+def _usage(counts: Dict[str, Optional[int]]) -> Optional[Dict[str, int]]:
+    prompt_tokens = counts.get("prompt_tokens")
+    completion_tokens = counts.get("completion_tokens")
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    usage = {"prompt_tokens": prompt_tokens or 0,
+             "completion_tokens": completion_tokens or 0}
+    # prompt-cache counters, only when the provider reports them
+    for key in ("cache_read_tokens", "cache_write_tokens"):
+        if counts.get(key) is not None:
+            usage[key] = counts[key]
+    return usage
+
+def _with_static_context(user_content: str, static_context: Optional[str]) -> str:
+    # the static part goes first so it forms a stable prompt prefix,
+    # which is what providers with automatic prefix caching key on
+    return f"{static_context}\n\n{user_content}" if static_context else user_content
+
+class ProviderAdapter:
+    """
+    Base class for a provider adapter. Subclasses name the SDK module and
+    client classes, build the request and pull text out of the responses;
+    the sync, async and streaming plumbing is shared.
+
+    Every request also takes two prompt-caching options: static_context,
+    text that stays the same across calls (e.g. retrieved documents) and
+    is sent ahead of user_content, and cache_prompt, which asks providers
+    with explicit prompt caching to cache the system prompt and the
+    static_context.
+    """
+    name = None
+    module_name = None
+    sync_class = None
+    async_class = None
+
+    def load(self):
+        return importlib.import_module(self.module_name)
+
+    def client_class(self, is_async: bool = False) -> type:
+        class_name = self.async_class if is_async else self.sync_class
+        if class_name is None:
+            raise ValueError(f"Provider '{self.name}' has no {'async' if is_async else 'sync'} client.")
+        return getattr(self.load(), class_name)
+
+    def _loaded_classes(self) -> tuple:
+        # a client of this provider can only exist once its SDK has been
+        # imported, so never import it just to answer isinstance checks
+        module = sys.modules.get(self.module_name)
+        if module is None:
+            return ()
+        return tuple(getattr(module, c) for c in (self.sync_class, self.async_class) if c)
+
+    def owns(self, clnt: object) -> bool:
+        return isinstance(clnt, self._loaded_classes())
+
+    def is_async(self, clnt: object) -> bool:
+        return self.async_class is not None and isinstance(clnt, getattr(self.load(), self.async_class))
+
+    def pooled_client_kwargs(self, is_async: bool, limits: Dict[str, float]) -> Dict[str, object]:
+        """
+        Extra constructor kwargs that cap the connection pool of a shared
+        client. limits holds max_connections, max_keepalive_connections
+        and keepalive_expiry. Providers without an httpx transport add nothing.
+        """
+        return {}
+
+    def close(self, clnt: object) -> None:
+        close = getattr(clnt, "close", None)
+        if close is not None:
+            close()
+
+    async def aclose(self, clnt: object) -> None:
+        close = getattr(clnt, "close", None)
+        if close is not None:
+            result = close()
+            if hasattr(result, "__await__"):
+                await result
+
+    def call(self, clnt: object, model: str, system_content: str, user_content: str,
+             temperature: float, max_tokens: Optional[int], stream: bool = False, aio: bool = False,
+             static_context: Optional[str] = None, cache_prompt: bool = False):
+        raise NotImplementedError
+
+    def response_text(self, response) -> str:
+        raise NotImplementedError
+
+    def response_usage(self, response) -> Optional[Dict[str, int]]:
+        return None
+
+    def stream_text(self, event, counts: Dict[str, Optional[int]]) -> Optional[str]:
+        raise NotImplementedError
+
+    def chat(self, clnt: object, model: str, system_content: str, user_content: str,
+             temperature: float = 0.8, max_tokens: Optional[int] = None, **options) -> str:
+        return self.chat_with_usage(clnt, model, system_content, user_content,
+                                    temperature, max_tokens, **options)[0]
+
+    async def achat(self, clnt: object, model: str, system_content: str, user_content: str,
+                    temperature: float = 0.8, max_tokens: Optional[int] = None, **options) -> str:
+        return (await self.achat_with_usage(clnt, model, system_content, user_content,
+                                            temperature, max_tokens, **options))[0]
+
+    def chat_with_usage(self, clnt: object, model: str, system_content: str, user_content: str,
+                        temperature: float = 0.8, max_tokens: Optional[int] = None,
+                        **options) -> Tuple[str, Optional[Dict[str, int]]]:
+        """
+        Return the response text and the usage stats the provider reported, if any.
+        """
+        response = self.call(clnt, model, system_content, user_content, temperature, max_tokens,
+                             **options)
+        return self.response_text(response), self.response_usage(response)
+
+    async def achat_with_usage(self, clnt: object, model: str, system_content: str, user_content: str,
+                               temperature: float = 0.8, max_tokens: Optional[int] = None,
+                               **options) -> Tuple[str, Optional[Dict[str, int]]]:
+        response = await self.call(clnt, model, system_content, user_content,
+                                   temperature, max_tokens, aio=True, **options)
+        return self.response_text(response), self.response_usage(response)
+
+    def stream(self, clnt: object, model: str, system_content: str, user_content: str,
+               temperature: float = 0.8, max_tokens: Optional[int] = None, **options) -> Iterator[StreamChunk]:
+        counts = {}
+        for event in self.call(clnt, model, system_content, user_content,
+                               temperature, max_tokens, stream=True, **options):
+            text = self.stream_text(event, counts)
+            if text:
+                yield StreamChunk(text=text)
+        yield StreamChunk(done=True, usage=_usage(counts))
+
+    async def astream(self, clnt: object, model: str, system_content: str, user_content: str,
+                      temperature: float = 0.8, max_tokens: Optional[int] = None,
+                      **options) -> AsyncIterator[StreamChunk]:
+        counts = {}
+        events = await self.call(clnt, model, system_content, user_content,
+                                 temperature, max_tokens, stream=True, aio=True, **options)
+        async for event in events:
+            text = self.stream_text(event, counts)
+            if text:
+                yield StreamChunk(text=text)
+        yield StreamChunk(done=True, usage=_usage(counts))
+
+def _httpx_limits(limits: Dict[str, float]):
+    import httpx
+    return httpx.Limits(**limits)
+
+class _HttpxClientMixin:
+    # Anthropic and OpenAI take a ready-made httpx client; their
+    # Default*HttpxClient wrappers keep the SDK's own timeouts and
+    # redirect settings, so prefer them when the SDK has them
+    def pooled_client_kwargs(self, is_async, limits):
+        module = self.load()
+        if is_async:
+            http_client_class = getattr(module, "DefaultAsyncHttpxClient", None)
+        else:
+            http_client_class = getattr(module, "DefaultHttpxClient", None)
+        if http_client_class is None:
+            import httpx
+            http_client_class = httpx.AsyncClient if is_async else httpx.Client
+        return {"http_client": http_client_class(limits=_httpx_limits(limits))}
+
+class AnthropicAdapter(_HttpxClientMixin, ProviderAdapter):
+    name = 'anthropic'
+    module_name = 'anthropic'
+    sync_class = 'Anthropic'
+    async_class = 'AsyncAnthropic'
+
+    def call(self, clnt, model, system_content, user_content, temperature, max_tokens,
+             stream=False, aio=False, static_context=None, cache_prompt=False):
+        system = system_content
+        content = _with_static_context(user_content, static_context)
+        if cache_prompt:
+            # cache breakpoints after the system prompt and after the
+            # static context: everything up to a breakpoint is reused by
+            # later calls that send the same prefix; an empty system
+            # prompt gets neither a block nor a breakpoint
+            cache_control = {"type": "ephemeral"}
+            if system_content:
+                system = [{"type": "text", "text": system_content, "cache_control": cache_control}]
+            content = [{"type": "text", "text": user_content}]
+            if static_context:
+                content.insert(0, {"type": "text", "text": static_context, "cache_control": cache_control})
+        return clnt.messages.create(
+                model=model,
+                system = system,
+                messages=[{"role": "user", "content": content}],
+                max_tokens=ANTHROPIC_MAX_TOKENS if max_tokens is None else max_tokens,
+                temperature = temperature,
+                stream=stream)
+
+    def response_text(self, response):
+        return response.content[0].text
+
+    @staticmethod
+    def _usage_counts(usage, counts):
+        # input_tokens excludes tokens read from or written to the cache;
+        # report the whole prompt and the cache share separately
+        cache_read = getattr(usage, "cache_read_input_tokens", None)
+        cache_write = getattr(usage, "cache_creation_input_tokens", None)
+        counts["prompt_tokens"] = usage.input_tokens + (cache_read or 0) + (cache_write or 0)
+        counts["cache_read_tokens"] = cache_read
+        counts["cache_write_tokens"] = cache_write
+
+    def response_usage(self, response):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        counts = {"completion_tokens": usage.output_tokens}
+        self._usage_counts(usage, counts)
+        return _usage(counts)
+
+    def stream_text(self, event, counts):
+        # Anthropic reports input tokens on message_start and the running
+        # output token count on message_delta
+        if event.type == "message_start":
+            self._usage_counts(event.message.usage, counts)
+        elif event.type == "message_delta":
+            counts["completion_tokens"] = event.usage.output_tokens
+        elif event.type == "content_block_delta" and getattr(event.delta, "text", None):
+            return event.delta.text
+        return None
+
+class OpenAIAdapter(_HttpxClientMixin, ProviderAdapter):
+    name = 'openai'
+    module_name = 'openai'
+    sync_class = 'OpenAI'
+    async_class = 'AsyncOpenAI'
+
+    def call(self, clnt, model, system_content, user_content, temperature, max_tokens,
+             stream=False, aio=False, static_context=None, cache_prompt=False):
+        # OpenAI caches long prompt prefixes automatically; there is
+        # nothing to mark, only keep the static part up front
+        kwargs = {"stream": True, "stream_options": {"include_usage": True}} if stream else {}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        return clnt.chat.completions.create(
+                model=model,
+                messages=[{"role": "system", "content": system_content},
+                        {"role": "user", "content": _with_static_context(user_content, static_context)}],
+                temperature = temperature,
+                **kwargs)
+
+    def response_text(self, response):
+        return response.choices[0].message.content
+
+    @staticmethod
+    def _usage_counts(usage, counts):
+        counts["prompt_tokens"] = usage.prompt_tokens
+        counts["completion_tokens"] = usage.completion_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        counts["cache_read_tokens"] = getattr(details, "cached_tokens", None)
+
+    def response_usage(self, response):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        counts = {}
+        self._usage_counts(usage, counts)
+        return _usage(counts)
+
+    def stream_text(self, chunk, counts):
+        # with include_usage the last chunk has no choices, only usage
+        if chunk.usage is not None:
+            self._usage_counts(chunk.usage, counts)
+        if chunk.choices and chunk.choices[0].delta.content:
+            return chunk.choices[0].delta.content
+        return None
+
+class OllamaAdapter(ProviderAdapter):
+    name = 'ollama'
+    module_name = 'ollama'
+    sync_class = 'Client'
+    async_class = 'AsyncClient'
+
+    def pooled_client_kwargs(self, is_async, limits):
+        # extra ollama.Client kwargs are handed through to its httpx client
+        return {"limits": _httpx_limits(limits)}
+
+    def close(self, clnt):
+        clnt._client.close()
+
+    async def aclose(self, clnt):
+        if self.is_async(clnt):
+            await clnt._client.aclose()
+        else:
+            clnt._client.close()
+
+    def call(self, clnt, model, system_content, user_content, temperature, max_tokens,
+             stream=False, aio=False, static_context=None, cache_prompt=False):
+        options = {"temperature": temperature}
+        if max_tokens is not None:
+            options["num_predict"] = max_tokens
+        return clnt.chat(model=model,
+                messages=[{"role": "user",
+                           "content": _with_static_context(user_content, static_context)}],
+                options=options,
+                stream=stream)
+
+    def response_text(self, response):
+        return response['message']['content']
+
+    def response_usage(self, response):
+        return _usage({"prompt_tokens": response.get('prompt_eval_count'),
+                       "completion_tokens": response.get('eval_count')})
+
+    def stream_text(self, chunk, counts):
+        if chunk.get('done'):
+            counts["prompt_tokens"] = chunk.get('prompt_eval_count')
+            counts["completion_tokens"] = chunk.get('eval_count')
+        return chunk['message']['content'] or None
+
+class GeminiAdapter(ProviderAdapter):
+    name = 'google'
+    module_name = 'google.generativeai'
+    sync_class = 'GenerativeModel'
+    # GenerativeModel serves both paths through generate_content_async
+    async_class = 'GenerativeModel'
+
+    def call(self, clnt, model, system_content, user_content, temperature, max_tokens,
+             stream=False, aio=False, static_context=None, cache_prompt=False):
+        generate = clnt.generate_content_async if aio else clnt.generate_content
+        generation_config = {"temperature": temperature}
+        if max_tokens is not None:
+            generation_config["max_output_tokens"] = max_tokens
+        return generate(_with_static_context(user_content, static_context),
+                generation_config=generation_config,
+                stream=stream)
+
+    def response_text(self, response):
+        return response.text
+
+    def response_usage(self, response):
+        usage_metadata = getattr(response, "usage_metadata", None)
+        if usage_metadata is None:
+            return None
+        return _usage({"prompt_tokens": usage_metadata.prompt_token_count,
+                       "completion_tokens": usage_metadata.candidates_token_count})
+
+    def stream_text(self, chunk, counts):
+        usage_metadata = getattr(chunk, "usage_metadata", None)
+        if usage_metadata is not None:
+            counts["prompt_tokens"] = usage_metadata.prompt_token_count
+            counts["completion_tokens"] = usage_metadata.candidates_token_count
+        try:
+            return chunk.text or None
+        except ValueError:
+            # chunks without text parts, e.g. a trailing finish_reason
+            return None
+
+_PROVIDERS: Dict[str, ProviderAdapter] = {}
+
+def register_provider(adapter: ProviderAdapter) -> None:
+    """
+    Add or replace a provider adapter. Registering does not import the SDK.
+    """
+    _PROVIDERS[adapter.name] = adapter
+
+def get_provider(name: str) -> ProviderAdapter:
+    adapter = _PROVIDERS.get(name)
+    if adapter is None:
+        raise ValueError(f"Provider '{name}' not registered.")
+    return adapter
+
+def provider_for_client(clnt: object) -> ProviderAdapter:
+    for adapter in _PROVIDERS.values():
+        if adapter.owns(clnt):
+            return adapter
+    raise ValueError(f"Client '{clnt}' not registered or not supported.")
+
+def resolve_client_class(client_name: str) -> type:
+    """
+    Map a factory client name to its SDK class, importing the SDK on
+    first use: 'openai' -> openai.OpenAI, 'async_openai' -> openai.AsyncOpenAI.
+    """
+    is_async = client_name.startswith('async_')
+    provider = client_name[len('async_'):] if is_async else client_name
+    return get_provider(provider).client_class(is_async)
+
+for _adapter in (AnthropicAdapter(), OpenAIAdapter(), OllamaAdapter(), GeminiAdapter()):
+    register_provider(_adapter)
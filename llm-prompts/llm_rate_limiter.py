@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+#
+# Client-side rate limiting for the client factory. Each (provider, model)
+# gets a requests-per-minute and a tokens-per-minute token bucket. Callers
+# reserve capacity up front and wait their turn, so requests queue on our
+# side instead of being rejected with a 429 by the provider.
+#
+
+@lru_cache(maxsize=None)
+def _encoding(model: Optional[str]):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model) if model else "cl100k_base"
+    except KeyError:
+        # non-OpenAI models: cl100k_base is close enough for budgeting
+        name = "cl100k_base"
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # the BPE file is fetched on first use and may be unreachable offline
+        return None
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Estimate the number of tokens in text with tiktoken, falling back
+    to ~4 characters per token if tiktoken or its encodings are unavailable.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+class TokenBucket:
+    """
+    A token bucket holding up to capacity tokens, refilled at capacity
+    tokens per period seconds. reserve() always succeeds but may leave the
+    bucket in debt; the caller then waits until the debt is paid off, which
+    serves callers in the order they reserved.
+    """
+    def __init__(self, capacity: float, period: float = 60.0):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Take amount tokens and return how many seconds to wait before using them.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets per provider and model.
+
+        limiter = RateLimiter(default_rpm=60)
+        limiter.set_limit("openai", "gpt-4-turbo-preview", rpm=500, tpm=30000)
+        get_commpletion(client, model, system, user, rate_limiter=limiter)
+
+    Limits are looked up for (provider, model) first, then for the provider
+    alone, then the defaults. Providers are named as in the response cache:
+    'anthropic', 'ollama', 'google', or 'openai@<base_url>' for
+    OpenAI-compatible endpoints; a bare 'openai' limit matches all of those.
+    """
+    def __init__(self, default_rpm: Optional[float] = None, default_tpm: Optional[float] = None):
+        self.default_limit = (default_rpm, default_tpm)
+        self.limits: Dict[Tuple[str, Optional[str]], Tuple[Optional[float], Optional[float]]] = {}
+        self._buckets: Dict[Tuple[str, str], Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+
+    def set_limit(self, provider: str, model: Optional[str] = None,
+                  rpm: Optional[float] = None, tpm: Optional[float] = None) -> None:
+        with self._lock:
+            self.limits[(provider, model)] = (rpm, tpm)
+            # buckets are rebuilt with the new limits on next use
+            self._buckets.clear()
+
+    def _limit_for(self, provider: str, model: str) -> Tuple[Optional[float], Optional[float]]:
+        bare = provider.split('@')[0]
+        for key in ((provider, model), (bare, model), (provider, None), (bare, None)):
+            if key in self.limits:
+                return self.limits[key]
+        return self.default_limit
+
+    def _reserve(self, provider: str, model: str, tokens: int) -> float:
+        with self._lock:
+            buckets = self._buckets.get((provider, model))
+            if buckets is None:
+                rpm, tpm = self._limit_for(provider, model)
+                buckets = (TokenBucket(rpm) if rpm else None,
+                           TokenBucket(tpm) if tpm else None)
+                self._buckets[(provider, model)] = buckets
+            request_bucket, token_bucket = buckets
+            now = time.monotonic()
+            wait = 0.0
+            if request_bucket is not None:
+                wait = max(wait, request_bucket.reserve(1, now))
+            if token_bucket is not None:
+                wait = max(wait, token_bucket.reserve(tokens, now))
+            return wait
+
+    def acquire(self, provider: str, model: str, tokens: int = 0) -> float:
+        """
+        Block until a request of tokens tokens fits the budgets; returns
+        the seconds spent waiting.
+        """
+        wait = self._reserve(provider, model, tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, provider: str, model: str, tokens: int = 0) -> float:
+        """
+        Coroutine version of acquire(); waits without blocking the event loop.
+        """
+        wait = self._reserve(provider, model, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
@@ -0,0 +1,173 @@
+import os
+import pickle
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import ray
+
+from llm_clnt_factory_api import ClientFactory, CompletionResult, get_commpletion
+
+#
+# Distributed batch inference with Ray. A pool of actors, each holding one
+# warm client from the ClientFactory, spread across the cluster; prompts are
+# handed to the least busy actor, with a bounded number in flight, and the
+# results stream back in completion order. Give every actor the Ollama
+# host on its own node and one prompt set is spread over many local
+# Ollama instances.
+#
+#   for result in ray_map_completions(prompts, "openai", "gpt-4o-mini",
+#                                     "You are a helpful assistant.", num_actors=8):
+#       print(result.index, result.response if result.ok else result.error)
+#
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+def init_ray(address: Optional[str] = None, **kwargs) -> None:
+    """
+    Start or connect to Ray with this directory as the workers' working
+    directory, so the actors can import the client factory modules on
+    every node. Provider API keys must be set on the nodes or passed in
+    client_kwargs.
+    """
+    if ray.is_initialized():
+        return
+    runtime_env = {"working_dir": _HERE, "excludes": ["*.ipynb", "images/", "__pycache__/"]}
+    ray.init(address=address, runtime_env=runtime_env, **kwargs)
+
+def _portable(error: BaseException) -> BaseException:
+    # SDK exceptions often hold a live HTTP response and do not survive
+    # pickling back to the driver; send those as a RuntimeError instead
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+@ray.remote
+class CompletionActor:
+    """
+    Holds one client for the actor's lifetime, so its connection pool
+    stays warm across requests.
+    """
+    def __init__(self, client_name: str, client_kwargs: Dict, model: str,
+                 system_content: str, completion_kwargs: Dict, max_connections: int):
+        self.client_factory = ClientFactory(max_connections=max_connections)
+        self.client_factory.register_client(client_name)
+        self.clnt = self.client_factory.get_client(client_name, **client_kwargs)
+        self.model = model
+        self.system_content = system_content
+        self.completion_kwargs = completion_kwargs
+
+    def ready(self) -> str:
+        return ray.get_runtime_context().get_node_id()
+
+    def complete(self, index: int, user_content: str) -> CompletionResult:
+        try:
+            response = get_commpletion(self.clnt, self.model, self.system_content, user_content,
+                                       **self.completion_kwargs)
+            return CompletionResult(index, user_content, response=response)
+        except Exception as e:
+            return CompletionResult(index, user_content, error=_portable(e))
+
+class CompletionActorPool:
+    """
+    num_actors CompletionActors, each serving up to concurrency_per_actor
+    requests at once. Actors are spread across nodes by default; pass
+    actor_options (num_cpus, resources, scheduling_strategy, ...) to place
+    them otherwise. client_kwargs is used for every actor, or give
+    actor_client_kwargs, one dict per actor, e.g. a different Ollama host
+    for each. Other keyword arguments (temperature, max_tokens, ...) are
+    passed on to get_commpletion.
+    """
+    def __init__(self, client_name: str, model: str, system_content: str,
+                 num_actors: int = 4, concurrency_per_actor: int = 4,
+                 client_kwargs: Optional[Dict] = None,
+                 actor_client_kwargs: Optional[List[Dict]] = None,
+                 actor_options: Optional[Dict] = None, **completion_kwargs):
+        if actor_client_kwargs is None:
+            actor_client_kwargs = [client_kwargs or {}] * num_actors
+        if not actor_client_kwargs or concurrency_per_actor < 1:
+            raise ValueError("CompletionActorPool needs at least one actor and one request per actor")
+        init_ray()
+        options = {"max_concurrency": concurrency_per_actor, "scheduling_strategy": "SPREAD",
+                   **(actor_options or {})}
+        self.concurrency_per_actor = concurrency_per_actor
+        self.actors = [CompletionActor.options(**options).remote(client_name, kwargs, model, system_content,
+                                                                 completion_kwargs, concurrency_per_actor)
+                       for kwargs in actor_client_kwargs]
+        # wait until every actor has its client, so the first prompts
+        # do not pay for actor start-up
+        self.nodes = ray.get([actor.ready.remote() for actor in self.actors])
+
+    def map(self, prompts: Iterable[str], max_in_flight: Optional[int] = None) -> Iterator[CompletionResult]:
+        """
+        Yield a CompletionResult per prompt as each one completes; use
+        result.index to match it to its prompt. prompts is read lazily and
+        at most max_in_flight (by default every actor slot) are submitted
+        at a time, so a large or unbounded prompt source does not pile up
+        in the object store.
+        """
+        capacity = max_in_flight or len(self.actors) * self.concurrency_per_actor
+        load = [0] * len(self.actors)
+        pending = {}
+
+        def collect():
+            done, _ = ray.wait(list(pending), num_returns=1)
+            for ref in done:
+                actor, index, user_content = pending.pop(ref)
+                load[actor] -= 1
+                try:
+                    yield ray.get(ref)
+                except Exception as e:
+                    # the actor died or the task could not run
+                    yield CompletionResult(index, user_content, error=e)
+
+        for index, user_content in enumerate(prompts):
+            if len(pending) >= capacity:
+                yield from collect()
+            actor = min(range(len(self.actors)), key=load.__getitem__)
+            ref = self.actors[actor].complete.remote(index, user_content)
+            pending[ref] = (actor, index, user_content)
+            load[actor] += 1
+        while pending:
+            yield from collect()
+
+    def shutdown(self) -> None:
+        for actor in self.actors:
+            ray.kill(actor)
+        self.actors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+def ray_map_completions(prompts: Iterable[str], client_name: str, model: str, system_content: str,
+                        num_actors: int = 4, concurrency_per_actor: int = 4,
+                        client_kwargs: Optional[Dict] = None, max_in_flight: Optional[int] = None,
+                        **kwargs) -> Iterator[CompletionResult]:
+    """
+    Run prompts through a temporary CompletionActorPool and yield the
+    results as they complete. The actors are killed when the results are
+    exhausted or the generator is closed.
+    """
+    with CompletionActorPool(client_name, model, system_content, num_actors=num_actors,
+                             concurrency_per_actor=concurrency_per_actor,
+                             client_kwargs=client_kwargs, **kwargs) as pool:
+        yield from pool.map(prompts, max_in_flight=max_in_flight)
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv, find_dotenv
+
+    _ = load_dotenv(find_dotenv())
+    MODEL = os.getenv("MODEL", "mistral")
+    prompts = [f"In one sentence, what is the number {i} known for?" for i in range(32)]
+
+    # one actor per node talking to the Ollama server on that node
+    BOLD_BEGIN = "\033[1m"
+    BOLD_END   =   "\033[0m"
+    for result in ray_map_completions(prompts, "ollama", MODEL, "You are a helpful assistant.",
+                                      num_actors=2, concurrency_per_actor=2,
+                                      client_kwargs={"host": "http://localhost:11434"}):
+        response = result.response if result.ok else f"Error: {result.error}"
+        print(f"{BOLD_BEGIN}[{result.index}]{BOLD_END} {response}")
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "genai-cookbook", "llm_responses.sqlite")
+
+class ResponseCache:
+    """
+    Persistent on-disk cache of LLM responses, backed by a local SQLite file.
+
+    Entries are keyed on provider, model, system_content, user_content and the
+    sampling parameters. The cache holds at most max_entries rows, evicting the
+    least recently used ones, and each entry can expire after ttl seconds.
+    Pass an instance as the cache argument of get_commpletion.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 10000,
+                 ttl: Optional[float] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                response TEXT NOT NULL,
+                                created_at REAL NOT NULL,
+                                accessed_at REAL NOT NULL,
+                                expires_at REAL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_content: str, user_content: str,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        payload = json.dumps([provider, model, system_content, user_content, params or {}],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, provider: str, model: str, system_content: str, user_content: str,
+            params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        key = self.make_key(provider, model, system_content, user_content, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, expires_at FROM responses WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, provider: str, model: str, system_content: str, user_content: str,
+            params: Optional[Dict[str, Any]], response: str, ttl: Optional[float] = None) -> None:
+        """
+        Store a response. ttl overrides the cache-wide ttl for this entry.
+        """
+        key = self.make_key(provider, model, system_content, user_content, params)
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                               (key, response, now, now, expires_at))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        # drop expired entries first, then the least recently used
+        # ones until we are back under max_entries
+        cursor = self._conn.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                    (now,))
+        self.evictions += cursor.rowcount
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        overflow = size - self.max_entries
+        if overflow > 0:
+            cursor = self._conn.execute("""DELETE FROM responses WHERE key IN (
+                                             SELECT key FROM responses ORDER BY accessed_at LIMIT ?)""",
+                                        (overflow,))
+            self.evictions += cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self),
+                "max_entries": self.max_entries}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
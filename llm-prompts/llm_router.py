@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from llm_clnt_factory_api import astream_completion
+from llm_providers import StreamChunk
+
+#
+# Latency-aware routing across providers with hedged requests. Each request
+# goes to the target with the best recent time-to-first-token. If no token
+# arrives within that target's hedge deadline (a percentile of its recent
+# TTFTs), the same request is sent to the next best target; whichever
+# produces a first token first wins and the other one is cancelled. A
+# target whose request failed is ranked last for failure_cooldown seconds,
+# then tried again.
+#
+
+@dataclass
+class RouteTarget:
+    """
+    One place a request can be routed to: an async client from the
+    ClientFactory and the model to ask for on it.
+    """
+    name: str
+    client: object
+    model: str
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+class HedgedRouter:
+    """
+    Route completions to the target with the lowest recent median TTFT,
+    hedging to the runner-up when the first token is late.
+
+        router = HedgedRouter([RouteTarget("openai", AsyncOpenAI(), "gpt-4o-mini"),
+                               RouteTarget("anthropic", AsyncAnthropic(), "claude-3-haiku-20240307")])
+        async for chunk in router.astream(system_content, user_content):
+            ...
+
+    Until a target has min_samples TTFTs recorded, its hedge deadline is
+    default_hedge_delay seconds. A target that fails before its first token
+    goes to the back of the ranking for failure_cooldown seconds, so
+    requests do not keep paying for a round trip to a broken endpoint.
+    """
+    def __init__(self, targets: List[RouteTarget], hedge_percentile: float = 95.0,
+                 default_hedge_delay: float = 2.0, min_samples: int = 10, window: int = 100,
+                 failure_cooldown: float = 30.0):
+        if not targets:
+            raise ValueError("HedgedRouter needs at least one target")
+        self.targets = list(targets)
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.failure_cooldown = failure_cooldown
+        self._ttfts: Dict[str, deque] = {t.name: deque(maxlen=window) for t in self.targets}
+        self._last_failure: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {t.name: 0 for t in self.targets}
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def record(self, target: RouteTarget, ttft: float) -> None:
+        self._ttfts[target.name].append(ttft)
+
+    def record_failure(self, target: RouteTarget) -> None:
+        self._failures[target.name] += 1
+        self._last_failure[target.name] = time.monotonic()
+
+    def _failing(self, target: RouteTarget) -> bool:
+        failed_at = self._last_failure.get(target.name)
+        return failed_at is not None and time.monotonic() - failed_at < self.failure_cooldown
+
+    def ranked(self) -> List[RouteTarget]:
+        """
+        Targets by median recent TTFT; targets with no samples yet come
+        first so every target gets measured, and targets that failed
+        within failure_cooldown come last.
+        """
+        def score(target):
+            samples = self._ttfts[target.name]
+            return (self._failing(target), _percentile(list(samples), 50.0) if samples else -1.0)
+        return sorted(self.targets, key=score)
+
+    def hedge_delay(self, target: RouteTarget) -> float:
+        samples = self._ttfts[target.name]
+        if len(samples) < self.min_samples:
+            return self.default_hedge_delay
+        return _percentile(list(samples), self.hedge_percentile)
+
+    def stats(self) -> Dict[str, object]:
+        per_target = {}
+        for name, samples in self._ttfts.items():
+            samples = list(samples)
+            per_target[name] = {"samples": len(samples),
+                                "failures": self._failures[name],
+                                "p50_ttft": _percentile(samples, 50.0) if samples else None,
+                                "p95_ttft": _percentile(samples, 95.0) if samples else None}
+        return {"targets": per_target,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won}
+
+    @staticmethod
+    async def _discard(stream, task: asyncio.Task) -> None:
+        task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+        try:
+            await stream.aclose()
+        except Exception:
+            pass
+
+    async def astream(self, system_content: str, user_content: str,
+                      temperature: float = 0.8, max_tokens: Optional[int] = None) -> AsyncIterator[StreamChunk]:
+        """
+        Stream the completion from whichever target produces a first token first.
+        """
+        ranked = self.ranked()
+        attempts = {}
+        # attempts launched because the first token was late, as opposed
+        # to failing over after an error
+        hedges = set()
+
+        def launch(target, hedge=False):
+            stream = astream_completion(target.client, target.model, system_content, user_content,
+                                        temperature=temperature, max_tokens=max_tokens)
+            task = asyncio.ensure_future(stream.__anext__())
+            attempts[task] = (target, stream, time.perf_counter())
+            if hedge:
+                hedges.add(task)
+
+        launch(ranked[0])
+        backups = ranked[1:]
+        deadline = self.hedge_delay(ranked[0])
+        winner = None
+        error = None
+        while attempts and winner is None:
+            done, _ = await asyncio.wait(attempts.keys(), timeout=deadline,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # first token is late: hedge to the next best target
+                if backups:
+                    self.hedges_fired += 1
+                    launch(backups.pop(0), hedge=True)
+                deadline = None
+                continue
+            for task in done:
+                target, stream, started = attempts.pop(task)
+                if task.exception() is None:
+                    if winner is None:
+                        winner = (task, target, stream, started)
+                    else:
+                        await self._discard(stream, task)
+                else:
+                    error = task.exception()
+                    self.record_failure(target)
+            if winner is None and not attempts and backups:
+                # the request failed before its first token; go
+                # straight to the next target instead of waiting
+                launch(backups.pop(0))
+
+        if winner is None:
+            raise error
+
+        task, target, stream, started = winner
+        self.record(target, time.perf_counter() - started)
+        if task in hedges:
+            self.hedges_won += 1
+        for loser, (loser_target, loser_stream, loser_started) in attempts.items():
+            # the loser's TTFT is at least this long; recording it steers
+            # the next requests away from a slow target
+            self.record(loser_target, time.perf_counter() - loser_started)
+            await self._discard(loser_stream, loser)
+
+        yield task.result()
+        async for chunk in stream:
+            yield chunk
+
+    async def acomplete(self, system_content: str, user_content: str,
+                        temperature: float = 0.8, max_tokens: Optional[int] = None) -> str:
+        parts = []
+        async for chunk in self.astream(system_content, user_content,
+                                        temperature=temperature, max_tokens=max_tokens):
+            parts.append(chunk.text)
+        return "".join(parts)
+
+    def complete(self, system_content: str, user_content: str,
+                 temperature: float = 0.8, max_tokens: Optional[int] = None) -> str:
+        return asyncio.run(self.acomplete(system_content, user_content,
+                                          temperature=temperature, max_tokens=max_tokens))
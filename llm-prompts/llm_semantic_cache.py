@@ -0,0 +1,186 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+# cosine similarity at which two prompts count as the same prompt,
+# allowing for float32 rounding in the embeddings
+SAME_PROMPT_SIMILARITY = 0.9999
+
+class SemanticCache:
+    """
+    In-memory semantic cache of LLM responses. A lookup embeds the user
+    prompt with the same all-MiniLM-L6-v2 SentenceTransformer the RAG
+    scripts use, and returns a stored response when an earlier prompt is
+    within threshold cosine similarity. Only prompts sent with the same
+    provider, model, system_content and sampling parameters can match.
+
+    Embeddings live in one preallocated float32 matrix of max_entries rows;
+    when it is full the least recently used entry is overwritten. Entries
+    older than ttl seconds are ignored and recycled. It has the same get/put
+    interface as ResponseCache, so it plugs into get_commpletion's cache
+    argument:
+
+        cache = SemanticCache(threshold=0.92)
+        get_commpletion(client, model, system_content, user_content, cache=cache)
+    """
+    def __init__(self, threshold: float = 0.9, max_entries: int = 1000,
+                 ttl: Optional[float] = None, model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 encoder: Optional[object] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.model_name = model_name
+        self._encoder = encoder
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._scopes = [None] * max_entries
+        self._responses = [None] * max_entries
+        self._expires_at = np.full(max_entries, np.inf)
+        # slot -> None, in least to most recently used order
+        self._lru = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._recent_embeddings = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self.model_name)
+        return self._encoder
+
+    def _embed(self, text: str) -> np.ndarray:
+        # get() and the put() after a miss embed the same prompt;
+        # remember the last few so it is encoded only once
+        with self._lock:
+            vector = self._recent_embeddings.get(text)
+            if vector is not None:
+                return vector
+        vector = np.asarray(self.encoder.encode(text, normalize_embeddings=True), dtype=np.float32)
+        with self._lock:
+            self._recent_embeddings[text] = vector
+            if len(self._recent_embeddings) > 256:
+                self._recent_embeddings.popitem(last=False)
+        return vector
+
+    @staticmethod
+    def _scope(provider: str, model: str, system_content: str, params: Optional[Dict[str, Any]]) -> str:
+        return json.dumps([provider, model, system_content, params or {}], sort_keys=True, default=str)
+
+    def get(self, provider: str, model: str, system_content: str, user_content: str,
+            params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        vector = self._embed(user_content)
+        scope = self._scope(provider, model, system_content, params)
+        now = time.time()
+        with self._lock:
+            slots = [slot for slot in self._lru if self._scopes[slot] == scope]
+            if slots:
+                scores = self._vectors[slots] @ vector
+                scores[self._expires_at[slots] <= now] = -np.inf
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    slot = slots[best]
+                    self._lru.move_to_end(slot)
+                    self.hits += 1
+                    return self._responses[slot]
+            self.misses += 1
+            return None
+
+    def put(self, provider: str, model: str, system_content: str, user_content: str,
+            params: Optional[Dict[str, Any]], response: str, ttl: Optional[float] = None) -> None:
+        vector = self._embed(user_content)
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self._reclaim_expired(now)
+            scope = self._scope(provider, model, system_content, params)
+            slot = self._same_prompt(scope, vector)
+            if slot is not None:
+                # the prompt is already stored, e.g. by a CacheChain
+                # back-fill or concurrent misses; overwrite its entry
+                del self._lru[slot]
+            elif self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._lru.popitem(last=False)
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._scopes[slot] = scope
+            self._responses[slot] = response
+            self._expires_at[slot] = now + ttl if ttl is not None else np.inf
+            self._lru[slot] = None
+
+    def _same_prompt(self, scope: str, vector: np.ndarray) -> Optional[int]:
+        slots = [slot for slot in self._lru if self._scopes[slot] == scope]
+        if not slots:
+            return None
+        scores = self._vectors[slots] @ vector
+        best = int(np.argmax(scores))
+        return slots[best] if scores[best] >= SAME_PROMPT_SIMILARITY else None
+
+    def _reclaim_expired(self, now: float) -> None:
+        for slot in [s for s in self._lru if self._expires_at[s] <= now]:
+            del self._lru[slot]
+            self._scopes[slot] = self._responses[slot] = None
+            self._free.append(slot)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._lru)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+            self._scopes = [None] * self.max_entries
+            self._responses = [None] * self.max_entries
+            self._expires_at = np.full(self.max_entries, np.inf)
+            self._recent_embeddings.clear()
+
+class CacheChain:
+    """
+    Consult several caches in order, e.g. the exact-match ResponseCache
+    before the SemanticCache, and fill the earlier ones on a later hit.
+
+        cache = CacheChain(ResponseCache(), SemanticCache())
+    """
+    def __init__(self, *caches):
+        self.caches = caches
+
+    def get(self, provider: str, model: str, system_content: str, user_content: str,
+            params: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        for i, cache in enumerate(self.caches):
+            response = cache.get(provider, model, system_content, user_content, params)
+            if response is not None:
+                for earlier in self.caches[:i]:
+                    earlier.put(provider, model, system_content, user_content, params, response)
+                return response
+        return None
+
+    def put(self, provider: str, model: str, system_content: str, user_content: str,
+            params: Optional[Dict[str, Any]], response: str) -> None:
+        for cache in self.caches:
+            cache.put(provider, model, system_content, user_content, params, response)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+#
+# In-flight request coalescing ("singleflight"). While a call for a key is
+# running, other callers asking for the same key wait for it and share its
+# result (or its exception) instead of issuing their own upstream request.
+# Nothing is remembered once the call finishes; that is the caches' job.
+#
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key, across threads with do()
+    and across coroutines on one event loop with ado().
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], _AsyncCall] = {}
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # tasks belong to one event loop, so key them by loop as well
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        call = self._async_calls.get(loop_key)
+        if call is None:
+            # the call runs as a task of its own, so it outlives the
+            # caller that started it for as long as anyone still waits
+            call = self._async_calls[loop_key] = _AsyncCall(loop.create_task(fn()))
+            call.task.add_done_callback(lambda _: self._async_calls.pop(loop_key, None))
+        else:
+            self.shared += 1
+        call.waiters += 1
+        try:
+            # shield so one waiter being cancelled does not cancel the call
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1:
+                # the last one waiting gave up; stop the upstream request
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
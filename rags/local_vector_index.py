@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+#
+# A local, exact vector index with the part of the Pinecone index API the
+# RAG scripts use: upsert, query, delete, update, fetch and
+# describe_index_stats, returning results of the same shape, so
+# extract_matches and print_matches work on either. Vectors are float32
+# rows in a memory-mapped file and metadata lives in a SQLite sidecar, so
+# opening an index is an mmap rather than a network round trip, and only
+# the rows a query touches are paged in. Queries are exact: one matrix
+# product over every vector, with argpartition for the top k. That is
+# fast enough for a few million 384-dimension vectors on one box, and a
+# baseline to compare the recall and latency of a hosted index against.
+#
+#   index = LocalVectorIndex("~/rags/local-index", dimension=384)
+#   index.upsert(vectors=[{"id": "a", "values": embedding, "metadata": {"text": chunk}}])
+#   results = index.query(vector=query_embedding, top_k=5, include_metadata=True)
+#   print_matches(results)
+#
+
+METRICS = ("cosine", "dotproduct")
+
+def _check_namespace(namespace):
+    # one index is one partition; rather than mix vectors across
+    # partitions, refuse namespaces other than the default
+    if namespace:
+        raise ValueError(f"LocalVectorIndex has no namespaces; got namespace={namespace!r}. "
+                         "Use a separate index directory per partition.")
+
+class LocalVectorIndex:
+    """
+    An index stored in directory path as vectors.f32, a (capacity,
+    dimension) float32 memory map, and metadata.sqlite, which maps each
+    id to its row and metadata. dimension and metric are needed only to
+    create the index; an existing one keeps its own. With metric
+    "cosine", vectors are stored normalized and scores are cosine
+    similarities, as Pinecone returns them. There are no namespaces:
+    passing one other than the default raises ValueError.
+    """
+    def __init__(self, path, dimension=None, metric="cosine"):
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.path, "metadata.sqlite"), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS vectors (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                metadata TEXT);
+        """)
+        info = dict(self._conn.execute("SELECT key, value FROM info"))
+        if info:
+            self.dimension = int(info["dimension"])
+            self.metric = info["metric"]
+            if dimension is not None and dimension != self.dimension:
+                raise ValueError(f"Index at {self.path} has dimension {self.dimension}, not {dimension}")
+        else:
+            if dimension is None:
+                raise ValueError(f"No index at {self.path}; give a dimension to create one")
+            if metric not in METRICS:
+                raise ValueError(f"metric must be one of {METRICS}")
+            self.dimension, self.metric = dimension, metric
+            self._conn.executemany("INSERT INTO info VALUES (?, ?)",
+                                   [("dimension", str(dimension)), ("metric", metric)])
+            self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        if not os.path.exists(self._vectors_path):
+            open(self._vectors_path, "wb").close()
+        self._map(max(self._count, 1024))
+
+    def _map(self, capacity):
+        # size the file for capacity rows and map it
+        size = capacity * self.dimension * 4
+        if os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(size)
+        self._capacity = os.path.getsize(self._vectors_path) // (self.dimension * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(self._capacity, self.dimension))
+
+    def _prepare(self, values):
+        vectors = np.asarray(values, dtype=np.float32).reshape(-1, self.dimension)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return vectors
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        """
+        Insert or overwrite vectors, given as dicts with "id", "values" and
+        optional "metadata", or as (id, values[, metadata]) tuples.
+        """
+        _check_namespace(namespace)
+        records = [(v["id"], v["values"], v.get("metadata")) if isinstance(v, dict)
+                   else (v[0], v[1], v[2] if len(v) > 2 else None) for v in vectors]
+        if not records:
+            return {"upserted_count": 0}
+        values = self._prepare([values for _, values, _ in records])
+        with self._lock:
+            rows = self._rows([c_id for c_id, _, _ in records])
+            new = [c_id for c_id in dict.fromkeys(c_id for c_id, _, _ in records) if c_id not in rows]
+            if self._count + len(new) > self._capacity:
+                self._vectors.flush()
+                self._map(max(self._capacity * 2, self._count + len(new)))
+            for c_id in new:
+                rows[c_id] = self._count
+                self._count += 1
+            for (c_id, _, _), vector in zip(records, values):
+                self._vectors[rows[c_id]] = vector
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (id, row, metadata) VALUES (?, ?, ?)",
+                                   [(c_id, rows[c_id], json.dumps(metadata) if metadata is not None else None)
+                                    for c_id, _, metadata in records])
+            self._vectors.flush()
+            self._conn.commit()
+        return {"upserted_count": len(records)}
+
+    def _rows(self, ids):
+        rows = {}
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            query = f"SELECT id, row FROM vectors WHERE id IN ({','.join('?' * len(batch))})"
+            rows.update(self._conn.execute(query, batch))
+        return rows
+
+    def query(self, vector, top_k=10, include_values=False, include_metadata=False, namespace=None, **kwargs):
+        """
+        The top_k vectors most similar to vector, best first, as
+        {"matches": [{"id", "score"[, "values"][, "metadata"]}, ...]}.
+        """
+        _check_namespace(namespace)
+        query = self._prepare(vector)[0]
+        with self._lock:
+            count = self._count
+            scores = self._vectors[:count] @ query
+            k = min(top_k, count)
+            if k == 0:
+                return {"matches": [], "namespace": namespace or ""}
+            # argpartition finds the top k in linear time; only they are sorted
+            top = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+            top = top[np.argsort(-scores[top])]
+            placeholders = ",".join("?" * len(top))
+            found = {row: (c_id, metadata) for c_id, row, metadata in self._conn.execute(
+                f"SELECT id, row, metadata FROM vectors WHERE row IN ({placeholders})", top.tolist())}
+            matches = []
+            for row in top.tolist():
+                c_id, metadata = found[row]
+                match = {"id": c_id, "score": float(scores[row])}
+                if include_values:
+                    match["values"] = self._vectors[row].tolist()
+                if include_metadata:
+                    match["metadata"] = json.loads(metadata) if metadata else {}
+                matches.append(match)
+        return {"matches": matches, "namespace": namespace or ""}
+
+    def fetch(self, ids, namespace=None):
+        _check_namespace(namespace)
+        with self._lock:
+            rows = self._rows(list(ids))
+            found = {}
+            for c_id, row in rows.items():
+                metadata = self._conn.execute("SELECT metadata FROM vectors WHERE id = ?", (c_id,)).fetchone()[0]
+                found[c_id] = {"id": c_id, "values": self._vectors[row].tolist(),
+                               "metadata": json.loads(metadata) if metadata else {}}
+        return {"vectors": found, "namespace": namespace or ""}
+
+    def update(self, id, values=None, set_metadata=None, namespace=None):
+        _check_namespace(namespace)
+        with self._lock:
+            found = self._conn.execute("SELECT row, metadata FROM vectors WHERE id = ?", (id,)).fetchone()
+            if found is None:
+                raise KeyError(id)
+            row, metadata = found
+            if values is not None:
+                self._vectors[row] = self._prepare(values)[0]
+                self._vectors.flush()
+            if set_metadata:
+                metadata = {**(json.loads(metadata) if metadata else {}), **set_metadata}
+                self._conn.execute("UPDATE vectors SET metadata = ? WHERE id = ?", (json.dumps(metadata), id))
+                self._conn.commit()
+        return {}
+
+    def delete(self, ids=None, delete_all=False, namespace=None):
+        """
+        Delete vectors by id, or all of them. The last rows are moved into
+        the freed ones, so the vectors stay contiguous for queries.
+        """
+        _check_namespace(namespace)
+        with self._lock:
+            if delete_all:
+                self._conn.execute("DELETE FROM vectors")
+                self._count = 0
+            else:
+                for row in sorted(self._rows(list(ids or [])).values(), reverse=True):
+                    last = self._count - 1
+                    self._conn.execute("DELETE FROM vectors WHERE row = ?", (row,))
+                    if row != last:
+                        self._vectors[row] = self._vectors[last]
+                        self._conn.execute("UPDATE vectors SET row = ? WHERE row = ?", (row, last))
+                    self._count -= 1
+                self._vectors.flush()
+            self._conn.commit()
+        return {}
+
+    def describe_index_stats(self):
+        return {"dimension": self.dimension,
+                "metric": self.metric,
+                "index_fullness": 0.0,
+                "total_vector_count": self._count,
+                "namespaces": {"": {"vector_count": self._count}} if self._count else {}}
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
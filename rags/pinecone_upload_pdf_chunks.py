@@ -1,87 +1,165 @@
-from rag_utils import read_pdf_chunks, extract_matches
+from rag_utils import iter_pdf_chunks, iter_pdf_chunks_parallel, extract_matches, embed_and_upsert, IngestStats, IngestManifest
 from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone, PodSpec
 from dotenv import load_dotenv, find_dotenv
 from tqdm.auto import tqdm
+import argparse
 import os
+import shutil
 
 # 
 # Usage example of how to upload PDF to Pinecone, index it,
 # and use it for semantic search query
+#
+# Chunks are encoded ENCODE_BATCH_SIZE at a time and upserted
+# UPSERT_BATCH_SIZE vectors per request, with the upload of one batch
+# overlapping the encoding of the next, rather than one model call and
+# one request per chunk. PDFs are parsed and chunked a page at a time,
+# so encoding starts on the first pages while the rest are still being
+# parsed, and memory does not grow with the size of the document.
+#
+# PDF parsing is CPU-bound; with --workers N the files are parsed in N
+# processes, large ones split into --pages-per-shard page ranges, and
+# the chunks come back in order to the one encode and upsert stage:
+#
+# python rags/pinecone_upload_pdf_chunks.py --workers 16 --pages-per-shard 50
+#
+# Ingestion is incremental. A local manifest keeps each file's hash and
+# the content-derived ids of its chunks. A re-run skips unchanged files,
+# embeds only the new chunks of changed files, and deletes the vectors of
+# chunks and files that are gone. --rebuild starts the index afresh. The
+# manifest records which index it describes, and is ignored if that
+# index is replaced or found empty.
+#
+# --local-index DIR builds a LocalVectorIndex in DIR instead, with no
+# Pinecone account or network needed; rag_search_pinecone_pdf_docs.py
+# takes the same option to search it.
 #  
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Chunk, embed and upload PDFs to a Pinecone index")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes parsing PDFs; 1 parses them one after another in this process")
+    parser.add_argument("--pages-per-shard", type=int, default=50,
+                        help="with --workers, split PDFs into page ranges of this size")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="delete the index and its manifest and ingest everything again")
+    parser.add_argument("--local-index", default=None,
+                        help="directory of a local memory-mapped index to use instead of Pinecone")
+    args = parser.parse_args()
+
     home_dir = os.path.expanduser('~')
     DIR_PATH = os.path.join(home_dir, 'rags/pdfs')
     model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
     verbose = True
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 20
+    ENCODE_BATCH_SIZE = 64
+    UPSERT_BATCH_SIZE = 100
 
-    # Set up Pinecone environment. Use the .env file to load the Pinecone API key
-    # and the environment name, which is "gcp-starter" in this case, for the GCP starter environment.
-    # a community edition of Pinecone is also available for free.
-    _ = load_dotenv(find_dotenv())
-    api_key = os.getenv("PINECONE_API_KEY")
-    if api_key is None:
-        raise ValueError("Please set the PINECONE_API_KEY environment")
-    pc = Pinecone(
-        api_key=api_key,
-        environment="gcp-starter",
-        spec=PodSpec(environment="gcp-starter")
-    ) 
-
-    # check if index exists in pinecone
-    index_name = "starter-index"
-    existing_indexes = [
-        index_info["name"] for index_info in pc.list_indexes()
-    ]
-
-    if index_name in existing_indexes:
-        print(f"Index {index_name} already exists. Deleting it.")
-        pc.delete_index(index_name)
+    if args.local_index:
+        # the manifest is kept inside the index directory
+        from local_vector_index import LocalVectorIndex
 
-    print('-' * 50)
+        index_dir = os.path.expanduser(args.local_index)
+        if args.rebuild and os.path.exists(index_dir):
+            print(f"Index {index_dir} already exists. Deleting it.")
+            shutil.rmtree(index_dir)
+        print('-' * 50)
+        pindex = LocalVectorIndex(index_dir, dimension=384, metric="cosine")
+        MANIFEST_PATH = os.path.join(index_dir, "manifest.json")
+        index_identity = f"local:{os.path.abspath(index_dir)}"
+    else:
+        from pinecone import Pinecone, PodSpec
 
-    # Create a new index
-    print(f"Creating a new index {index_name}...")
-    pc.create_index(name=index_name,
-            metric="cosine",
-            dimension=384,
+        # Set up Pinecone environment. Use the .env file to load the Pinecone API key
+        # and the environment name, which is "gcp-starter" in this case, for the GCP starter environment.
+        # a community edition of Pinecone is also available for free.
+        _ = load_dotenv(find_dotenv())
+        api_key = os.getenv("PINECONE_API_KEY")
+        if api_key is None:
+            raise ValueError("Please set the PINECONE_API_KEY environment")
+        pc = Pinecone(
+            api_key=api_key,
+            environment="gcp-starter",
             spec=PodSpec(environment="gcp-starter")
-    )
+        ) 
+
+        # check if index exists in pinecone
+        index_name = "starter-index"
+        existing_indexes = [
+            index_info["name"] for index_info in pc.list_indexes()
+        ]
+
+        # the manifest of what is in the index lives with the other local caches
+        MANIFEST_PATH = os.path.join(home_dir, '.cache', 'genai-cookbook', f'{index_name}-manifest.json')
 
-    # Connect or get a handle to the index
-    pindex = pc.Index(index_name)
+        if index_name in existing_indexes and args.rebuild:
+            print(f"Index {index_name} already exists. Deleting it.")
+            pc.delete_index(index_name)
+            existing_indexes.remove(index_name)
+        if args.rebuild and os.path.exists(MANIFEST_PATH):
+            os.remove(MANIFEST_PATH)
 
-    # read each file in the directory
-    for filename in tqdm(os.listdir(DIR_PATH)):
-        if filename.endswith('.pdf'):
-            file_path = os.path.join(DIR_PATH, filename)
+        print('-' * 50)
+
+        if index_name not in existing_indexes:
+            # Create a new index, and forget what a deleted one held
+            print(f"Creating a new index {index_name}...")
+            pc.create_index(name=index_name,
+                    metric="cosine",
+                    dimension=384,
+                    spec=PodSpec(environment="gcp-starter")
+            )
+            if os.path.exists(MANIFEST_PATH):
+                os.remove(MANIFEST_PATH)
+
+        # Connect or get a handle to the index
+        pindex = pc.Index(index_name)
+        index_identity = f"{index_name}@{pc.describe_index(index_name).host}"
+
+    # read each file in the directory, skipping those already indexed
+    stats = IngestStats()
+    manifest = IngestManifest(MANIFEST_PATH)
+    # a manifest written for another index, or for this one before it was
+    # deleted and recreated, says nothing about what it holds now
+    manifest.check_index(pindex, index_identity)
+    file_paths = [os.path.join(DIR_PATH, filename)
+                  for filename in sorted(os.listdir(DIR_PATH)) if filename.endswith('.pdf')]
+    changed = manifest.changed_files(file_paths)
+    print(f"{len(changed)} new or changed of {len(file_paths)} files")
+    if args.workers > 1:
+        print(f"Processing {len(changed)} files with {args.workers} workers...")
+        chunks = iter_pdf_chunks_parallel(changed, CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                          workers=args.workers, pages_per_shard=args.pages_per_shard,
+                                          stats=stats)
+        embed_and_upsert(model, pindex, manifest.records(tqdm(chunks, unit="chunk")),
+                         encode_batch_size=ENCODE_BATCH_SIZE,
+                         upsert_batch_size=UPSERT_BATCH_SIZE,
+                         stats=stats)
+    else:
+        for file_path in tqdm(changed):
             print(f"Processing file: {file_path}")
-            for i, chunk in enumerate(read_pdf_chunks(file_path, CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)):
-                
-                # Process each chunk (e.g., create vector embeddings)
-                embeddings = model.encode(chunk)
-
-                # create a metadata batch
-                c_id = "".join([str(i), '-', filename])
-                sample_doc = [
-                    { "id":  c_id ,
-                      "values": embeddings.tolist(),
-                      "metadata": {
-                          "text": chunk
-                        }
-                     }
-                ]
-                if verbose:
-                    if i % 100 == 0:
-                        print(f"Upserting batch id: { c_id}")
-                        
-                 # upsert to Pinecone
-                pindex.upsert(sample_doc)
+            chunks = ((file_path, chunk.page_content, chunk.metadata)
+                      for chunk in iter_pdf_chunks(file_path, CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                                   stats=stats))
+
+            # encode and upsert the new chunks to Pinecone in batches
+            chunks_before = stats.chunks
+            embed_and_upsert(model, pindex, manifest.records(chunks),
+                             encode_batch_size=ENCODE_BATCH_SIZE,
+                             upsert_batch_size=UPSERT_BATCH_SIZE,
+                             stats=stats)
+            # record the file as done, so an interrupted run resumes after it
+            deleted = manifest.commit(pindex)
+            if verbose:
+                print(f"Upserted {stats.chunks - chunks_before} new chunks from {os.path.basename(file_path)}, "
+                      f"deleted {deleted} stale ones")
             print('---')
 
+    # delete what is gone from the changed files, and files no longer in the directory
+    deleted = manifest.commit(pindex, file_paths)
+    print(f"Deleted {deleted} stale vectors")
+    print(stats.report())
     print('-' * 50)
 
     # Check the index stats
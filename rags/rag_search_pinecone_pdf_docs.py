@@ -1,12 +1,13 @@
 
 import sys 
 sys.path.insert(0, "llm-prompts")
+import argparse
 import os
-from anthropic import Anthropic
 
-from  llm_clnt_factory_api import ClientFactory, get_commpletion
+from  llm_clnt_factory_api import ClientFactory, stream_completion
+from llm_ledger import TokenLedger
+from llm_metrics import add_observer, tag_calls
 from rag_utils import print_matches, extract_matches
-from pinecone import Pinecone, PodSpec
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv, find_dotenv
 
@@ -14,27 +15,44 @@ from dotenv import load_dotenv, find_dotenv
 # Example code to search the Pinecode index for similarity search
 # of the PDF document indexed.
 #
+# --local-index DIR searches a LocalVectorIndex built with
+# pinecone_upload_pdf_chunks.py --local-index DIR instead, so retrieval
+# runs without a Pinecone account or network.
+#
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a question from the PDF index with an LLM")
+    parser.add_argument("--local-index", default=None,
+                        help="directory of a local memory-mapped index to search instead of Pinecone")
+    args = parser.parse_args()
+
     os.environ["TOKENIZERS_PARALLELISM"] = "false"
     TOP_K = 5
-    # Set up Pinecone environment. Use the .env file to load the Pinecone API key
-    # and the environment name, which is "gcp-starter" in this case, for the GCP starter environment.
-    # a community edition of Pinecone is also available for free.
     _ = load_dotenv(find_dotenv())
-    pinecone_api_key = os.getenv("PINECONE_API_KEY")
-    if pinecone_api_key is None:
-        raise ValueError("Please set the PINECONE_API_KEY environment")
-    pc = Pinecone(
-        api_key=pinecone_api_key,
-        environment="gcp-starter",
-        spec=PodSpec(environment="gcp-starter")
-    ) 
+    if args.local_index:
+        from local_vector_index import LocalVectorIndex
+
+        # opening the index maps its vectors; there is no server to reach
+        pindex = LocalVectorIndex(args.local_index)
+    else:
+        from pinecone import Pinecone, PodSpec
 
-    # Our starter pinecone index
-    index_name = "starter-index"
+        # Set up Pinecone environment. Use the .env file to load the Pinecone API key
+        # and the environment name, which is "gcp-starter" in this case, for the GCP starter environment.
+        # a community edition of Pinecone is also available for free.
+        pinecone_api_key = os.getenv("PINECONE_API_KEY")
+        if pinecone_api_key is None:
+            raise ValueError("Please set the PINECONE_API_KEY environment")
+        pc = Pinecone(
+            api_key=pinecone_api_key,
+            environment="gcp-starter",
+            spec=PodSpec(environment="gcp-starter")
+        ) 
 
-     # Connect or get a handle to the index
-    pindex = pc.Index(index_name)
+        # Our starter pinecone index
+        index_name = "starter-index"
+
+         # Connect or get a handle to the index
+        pindex = pc.Index(index_name)
 
     # create our model instance for encodin the query
     model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
@@ -67,12 +85,16 @@ if __name__ == "__main__":
     # client factory method 
     client_factory = ClientFactory()
     client_type = "anthropic"
-    client_factory.register_client(client_type, Anthropic)
+    client_factory.register_client(client_type)
     client_kwargs = {"api_key": anthropic_api_key}
 
     # create the client
     client = client_factory.create_client(client_type, **client_kwargs)
 
+    # record the tokens and cost of the RAG answer in the ledger;
+    # see the totals with python llm-prompts/llm_ledger.py
+    ledger = add_observer(TokenLedger(run_name="rag_search_pinecone_pdf_docs"))
+
     # create system and user prompt for the LLM model
     system_content = """You are master of all knowledge, and a helpful sage.
                         You must summarize content given to you by drawing from your vast
@@ -81,16 +103,30 @@ if __name__ == "__main__":
                         and use the given context to provide the response.
                      """
     
-    user_content = f"""What are the key takeaways for AI in 2023 from the HAI_AI Index Report_2023?,
-                        given the {context}. Only provide information that is true and verifiable
+    # the retrieved context goes in as static context rather than inside the
+    # question, so follow-up questions over the same matches reuse Anthropic's
+    # prompt cache for the system prompt and context instead of paying for them again
+    user_content = """What are the key takeaways for AI in 2023 from the HAI_AI Index Report_2023?
+                        Only provide information that is true and verifiable
                         and use the given context to provide the response.
                      """
+    static_context = f"Context:\n{context}"
     
     # get the response
     BOLD_BEGIN = "\033[1m"
     BOLD_END   =   "\033[0m"
-    response = get_commpletion(client, MODEL, system_content, user_content)
-    response = response.replace("```", "")
     print(f"\n{BOLD_BEGIN}Prompt:{BOLD_END} {user_content}")
-    print(f"\n{BOLD_BEGIN}Answer:{BOLD_END} {response}")
+    print(f"\n{BOLD_BEGIN}Answer:{BOLD_END} ", end="", flush=True)
+    # stream the answer so the first tokens show up as soon
+    # as the model produces them
+    with tag_calls("rag_search"):
+        for chunk in stream_completion(client, MODEL, system_content, user_content,
+                                       static_context=static_context, cache_prompt=True):
+            if chunk.done:
+                # cache_write_tokens on the first run, cache_read_tokens on
+                # repeat runs within the cache lifetime (about five minutes)
+                print(f"\n\nUsage: {chunk.usage}")
+            else:
+                print(chunk.text.replace("```", ""), end="", flush=True)
+    ledger.close()
     
\ No newline at end of file
@@ -1,5 +1,17 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from pypdf import PdfReader
 
 def extract_matches(results):
     """
@@ -35,4 +47,376 @@ def read_pdf_chunks(file_path, chunk_size, chunk_overlap=0):
         
         # return a list of chucked texts from the spliited 
         # text
-        return [t.page_content for t in texts]
\ No newline at end of file
+        return [t.page_content for t in texts]
+
+def _locate(spans, position):
+    # spans: (start in text, page, offset in page) for each page in a text
+    start, page, offset = max((span for span in spans if span[0] <= position), key=lambda span: span[0])
+    return page, offset + position - start
+
+# RecursiveCharacterTextSplitter's default separators, most preferred first
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+def iter_pdf_chunks(file_path, chunk_size, chunk_overlap=0, pages=None, stats=None):
+    """
+    Generator version of read_pdf_chunks: parse the pdf one page at a
+    time and yield each chunk as a Document as soon as it is split, with
+    "source", "page" and "offset" (the character offset of the chunk's
+    start within that page) in its metadata. Memory stays at about a
+    page, however long the document. pages, a (start, stop) range of
+    page numbers, limits it to those pages.
+
+    The last chunk of each page is held back and split again with the
+    start of the next page, so chunks and their chunk_overlap run across
+    page boundaries rather than stopping short at the end of every page.
+
+    The pages read and the time spent parsing and splitting them are
+    added to stats, if given.
+    """
+    chunks = _pdf_chunks(file_path, chunk_size, chunk_overlap, pages, stats)
+    return chunks if stats is None else _timed_parse(chunks, stats)
+
+def _timed_parse(chunks, stats):
+    # add the time spent producing each chunk, not consuming it, to stats
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        stats.parse_seconds += time.perf_counter() - start
+        if chunk is None:
+            return
+        yield chunk
+
+def _pdf_chunks(file_path, chunk_size, chunk_overlap, pages, stats):
+    if pages is None:
+        page_texts = ((page.metadata.get("page"), page.page_content)
+                      for page in PyPDFLoader(file_path).lazy_load())
+    else:
+        # open only the pages asked for, which the loader cannot do
+        reader = PdfReader(file_path)
+        page_texts = ((n, reader.pages[n].extract_text()) for n in range(*pages))
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size,
+                                                   chunk_overlap=chunk_overlap,
+                                                   separators=SEPARATORS)
+    # the overlap the splitter keeps can run past chunk_overlap by a separator
+    overlap = chunk_overlap + max(len(separator) for separator in SEPARATORS)
+    # the unfinished chunk carried over, and the pages it came from
+    carry, carry_spans = "", []
+    for page_number, page_text in page_texts:
+        if stats is not None:
+            stats.pages += 1
+        if not page_text.strip():
+            continue
+        page_start = len(carry) + 1 if carry else 0
+        text = f"{carry}\n{page_text}" if carry else page_text
+        spans = carry_spans + [(page_start, page_number, 0)]
+        chunks = text_splitter.split_text(text)
+        start, search_from = -1, 0
+        for n, chunk in enumerate(chunks):
+            # the next chunk starts at most overlap before this one ends;
+            # searching from there keeps repeated text from matching an
+            # earlier copy. Failing that, search from the last chunk's
+            # start: a short chunk can be a prefix of the next one.
+            found = text.find(chunk, search_from)
+            if found == -1:
+                found = text.find(chunk, max(start, 0))
+            start = found if found != -1 else search_from
+            search_from = max(start + len(chunk) - overlap, start + 1)
+            if n == len(chunks) - 1:
+                carry = chunk
+                carry_spans = [(0, *_locate(spans, start))]
+                carry_spans += [(s - start, p, o) for s, p, o in spans if start < s < start + len(chunk)]
+                break
+            chunk_page, offset = _locate(spans, start)
+            yield Document(page_content=chunk,
+                           metadata={"source": file_path, "page": chunk_page, "offset": offset})
+    if carry:
+        _, chunk_page, offset = carry_spans[0]
+        yield Document(page_content=carry,
+                       metadata={"source": file_path, "page": chunk_page, "offset": offset})
+
+def shard_pdfs(file_paths, pages_per_shard=None):
+    """
+    Split pdf files into (file_path, (start, stop)) page ranges of at most
+    pages_per_shard pages, in order, or one (file_path, None) per file
+    when pages_per_shard is None
+    """
+    shards = []
+    for file_path in file_paths:
+        if pages_per_shard is None:
+            shards.append((file_path, None))
+            continue
+        num_pages = len(PdfReader(file_path).pages)
+        for start in range(0, num_pages, pages_per_shard):
+            shards.append((file_path, (start, min(start + pages_per_shard, num_pages))))
+    return shards
+
+def _chunk_shard(args):
+    # runs in a worker process: parse and split one shard, and time it
+    file_path, pages, chunk_size, chunk_overlap = args
+    start = time.perf_counter()
+    chunks = [(chunk.page_content, chunk.metadata)
+              for chunk in iter_pdf_chunks(file_path, chunk_size, chunk_overlap, pages=pages)]
+    num_pages = len(PdfReader(file_path).pages) if pages is None else pages[1] - pages[0]
+    return chunks, num_pages, time.perf_counter() - start
+
+def iter_pdf_chunks_parallel(file_paths, chunk_size, chunk_overlap=0, workers=None,
+                             pages_per_shard=None, stats=None):
+    """
+    Parse and split pdfs in a pool of worker processes, sharded by file,
+    and by pages_per_shard page ranges for large files, and yield
+    (file_path, text, metadata) for every chunk in document order, as
+    iter_pdf_chunks would. At most two shards per worker are parsed
+    ahead of the consumer, so a slow embedding stage does not pile
+    parsed chunks up in memory. Chunk overlap does not run across page
+    range boundaries. Pages and worker parse time are added to stats.
+    """
+    stats = stats or IngestStats()
+    shards = deque((file_path, pages, chunk_size, chunk_overlap)
+                   for file_path, pages in shard_pdfs(file_paths, pages_per_shard))
+    # spawn rather than fork: the parent may hold model threads and CUDA state
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        window = 2 * (workers or multiprocessing.cpu_count())
+        pending = deque()
+        while shards or pending:
+            while shards and len(pending) < window:
+                shard = shards.popleft()
+                pending.append((shard[0], pool.apply_async(_chunk_shard, (shard,))))
+            file_path, result = pending.popleft()
+            chunks, num_pages, seconds = result.get()
+            stats.pages += num_pages
+            stats.parse_seconds += seconds
+            for text, metadata in chunks:
+                yield file_path, text, metadata
+
+def file_hash(file_path):
+    """
+    sha256 of a file's contents
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id(source, text):
+    """
+    Stable vector id for a chunk, derived from its source and its text,
+    so the same chunk gets the same id on every run however the chunks
+    around it change
+    """
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+# chunks fetched and re-upserted per request when their page or offset changes
+MOVED_BATCH_SIZE = 100
+
+class IngestManifest:
+    """
+    Local record of what is in a vector index: for each source, the hash
+    of its file and the ids, page and offset of its chunks. It makes
+    ingestion incremental and safe to re-run:
+
+        manifest = IngestManifest(path)
+        manifest.check_index(index, identity)   # forget it if the index is not the one it describes
+        changed = manifest.changed_files(file_paths)   # unchanged files are not even parsed
+        embed_and_upsert(model, index, manifest.records(chunks))   # only new chunks are embedded
+        manifest.commit(index, file_paths)   # delete stale and removed vectors, save
+
+    records() takes (source, text, metadata) and yields (id, text,
+    metadata) for the chunks the index does not have yet. commit() runs
+    once the upserts are done. It deletes the vectors of chunks that are
+    gone from a changed source, and of every source not in sources. It
+    re-upserts chunks that moved, in batches, with their new page and
+    offset, then saves the manifest. If a run dies before commit, the next run embeds the same
+    chunks again under the same ids, which is harmless.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}
+        self.index = None
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.sources = saved["sources"]
+            self.index = saved.get("index")
+        self._hashes = {}
+        self._seen = {}
+        self._moved = {}
+
+    def check_index(self, index, identity):
+        """
+        Tie the manifest to the index it describes. identity names the
+        index, e.g. its name and host. The recorded sources are dropped,
+        so everything is ingested again, if the manifest was written for
+        another index, or records vectors while the index is empty, as it
+        is after being deleted and recreated.
+        """
+        count = index.describe_index_stats()["total_vector_count"]
+        if self.index != identity or (self.sources and not count):
+            self.sources = {}
+        self.index = identity
+
+    def changed_files(self, file_paths):
+        """
+        The files that are new or whose contents changed since the last commit
+        """
+        changed = []
+        for file_path in file_paths:
+            source = os.path.basename(file_path)
+            digest = file_hash(file_path)
+            if self.sources.get(source, {}).get("hash") != digest:
+                self._hashes[source] = digest
+                changed.append(file_path)
+        return changed
+
+    def records(self, chunks):
+        for source, text, metadata in chunks:
+            source = os.path.basename(source)
+            c_id = chunk_id(source, text)
+            location = [metadata.get("page"), metadata.get("offset")]
+            seen = self._seen.setdefault(source, {})
+            if c_id in seen:
+                # the same text twice in one source is one vector
+                continue
+            seen[c_id] = location
+            known = self.sources.get(source, {}).get("chunks", {})
+            if c_id not in known:
+                yield c_id, text, {**metadata, "source": source}
+            elif known[c_id] != location:
+                self._moved[c_id] = {"page": location[0], "offset": location[1]}
+
+    def commit(self, index, sources=None):
+        """
+        Delete the vectors of chunks and sources that are gone, and save
+        the manifest. Call it with sources, file paths or names, when the
+        run is over: everything else is deleted from the index, and
+        changed files that gave no chunks at all are emptied. Without
+        sources it only records the sources records() has seen so far,
+        e.g. after each file. Returns the number of vectors deleted.
+        """
+        done = dict(self._seen)
+        if sources is not None:
+            for source in self._hashes:
+                done.setdefault(source, {})
+        stale = []
+        for source, chunks in done.items():
+            stale += [c_id for c_id in self.sources.get(source, {}).get("chunks", {}) if c_id not in chunks]
+            self.sources[source] = {"hash": self._hashes.pop(source, None), "chunks": chunks}
+        if sources is not None:
+            keep = {os.path.basename(source) for source in sources}
+            for source in [source for source in self.sources if source not in keep]:
+                stale += list(self.sources.pop(source)["chunks"])
+        for ids in batched(stale, 1000):
+            index.delete(ids=ids)
+        # a page inserted early in a long document moves every chunk after
+        # it: re-upsert them with their stored vectors, in batches, rather
+        # than one update request per chunk
+        for ids in batched(list(self._moved), MOVED_BATCH_SIZE):
+            fetched = index.fetch(ids=ids)["vectors"]
+            index.upsert(vectors=[{"id": c_id, "values": list(vector["values"]),
+                                   "metadata": {**(vector["metadata"] or {}), **self._moved[c_id]}}
+                                  for c_id, vector in fetched.items()])
+        self.save()
+        self._seen, self._moved = {}, {}
+        return len(stale)
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # write then rename, so an interrupted save leaves the old manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"index": self.index, "sources": self.sources}, f)
+        os.replace(tmp_path, self.path)
+
+def batched(iterable, batch_size):
+    """
+    Yield lists of up to batch_size items from iterable
+    """
+    it = iter(iterable)
+    while batch := list(islice(it, batch_size)):
+        yield batch
+
+@dataclass
+class IngestStats:
+    """
+    Counts and time spent in each ingestion stage: parsing (summed over
+    the worker processes), encoding and upserting. The stages overlap,
+    so their times can add up to more than wall_seconds.
+    """
+    chunks: int = 0
+    upserts: int = 0
+    pages: int = 0
+    parse_seconds: float = 0.0
+    encode_seconds: float = 0.0
+    upsert_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def chunks_per_sec(self):
+        return self.chunks / self.wall_seconds if self.wall_seconds else 0.0
+
+    def report(self):
+        """
+        Per-stage throughput: each stage's rate over the time it was busy
+        """
+        def rate(count, seconds, unit):
+            return f"{count / seconds:.1f} {unit}/sec" if seconds else "n/a"
+        lines = [f"ingested {self.chunks} chunks in {self.wall_seconds:.1f}s ({self.chunks_per_sec:.1f} chunks/sec)"]
+        if self.pages:
+            lines.append(f"  parse : {self.pages} pages in {self.parse_seconds:.1f} worker-seconds "
+                         f"({rate(self.pages, self.parse_seconds, 'pages')} per worker)")
+        lines.append(f"  encode: {self.chunks} chunks in {self.encode_seconds:.1f}s "
+                     f"({rate(self.chunks, self.encode_seconds, 'chunks')})")
+        lines.append(f"  upsert: {self.upserts} requests in {self.upsert_seconds:.1f}s "
+                     f"({rate(self.chunks, self.upsert_seconds, 'vectors')})")
+        return "\n".join(lines)
+
+def embed_and_upsert(model, index, records, encode_batch_size=64, upsert_batch_size=100,
+                     max_pending_upserts=2, namespace=None, stats=None):
+    """
+    Encode and upsert records, an iterable of (id, text, metadata)
+    tuples, in batches: encode_batch_size texts go through the model
+    at once, and vectors go to the index upsert_batch_size per request.
+    Upserts run on a background thread, so the next batch is encoded
+    while the previous one is uploaded; at most max_pending_upserts are
+    in flight, which bounds memory for large corpora. The text is kept
+    in the metadata under "text". Returns the IngestStats.
+    """
+    stats = stats or IngestStats()
+    start = time.perf_counter()
+    pending = []
+    buffer = []
+
+    def upsert(vectors):
+        t0 = time.perf_counter()
+        if namespace is None:
+            index.upsert(vectors=vectors)
+        else:
+            index.upsert(vectors=vectors, namespace=namespace)
+        return time.perf_counter() - t0
+
+    def collect(limit):
+        # wait for the oldest upserts; this also raises their errors
+        while len(pending) > limit:
+            stats.upsert_seconds += pending.pop(0).result()
+            stats.upserts += 1
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for batch in batched(records, encode_batch_size):
+            t0 = time.perf_counter()
+            embeddings = model.encode([text for _, text, _ in batch], batch_size=encode_batch_size)
+            stats.encode_seconds += time.perf_counter() - t0
+            for (c_id, text, metadata), embedding in zip(batch, embeddings):
+                buffer.append({"id": c_id,
+                               "values": embedding.tolist(),
+                               "metadata": {**(metadata or {}), "text": text}})
+            stats.chunks += len(batch)
+            while len(buffer) >= upsert_batch_size:
+                collect(max_pending_upserts - 1)
+                pending.append(executor.submit(upsert, buffer[:upsert_batch_size]))
+                buffer = buffer[upsert_batch_size:]
+        if buffer:
+            collect(max_pending_upserts - 1)
+            pending.append(executor.submit(upsert, buffer))
+        collect(0)
+    stats.wall_seconds += time.perf_counter() - start
+    return stats